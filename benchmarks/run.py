@@ -0,0 +1,162 @@
+'''
+Benchmarks the accessors of `CourseAPI` against the local stand-in server of `benchmarks.stub_server`.
+
+    python -m benchmarks.run --students 10000 --only students.info exp_records.get_info
+
+Each benchmark runs on a fresh `CourseAPI`, so nothing is served from the caches, and reports its wall
+time, the number of requests the server received, the peak memory traced by `tracemalloc` (measured
+in a second run, as tracing slows Python down) and the throughput in rows and requests per second.
+'''
+import argparse
+import contextlib
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+import requests
+
+import coursemology_api.auth
+from coursemology_api import CourseAPI
+from coursemology_api.utility import parallel_map
+
+from .stub_server import COURSE_ID, REALM, USERNAME, PASSWORD
+
+FIRST_ASSESSMENT = 1001
+FIRST_SURVEY = 1
+
+
+def submission_sample(course, size, max_workers):
+    submissions = course.Assessments(FIRST_ASSESSMENT).Submissions
+    ids = [row[0] for row in submissions.info.data[:size]]
+    results = parallel_map(lambda submission_id: submissions(submission_id).info, ids, max_workers=max_workers)
+    return [row for table, error in results if error is None for row in table.data]
+
+BENCHMARKS = {
+    'students.info':        lambda course, args: course.Users.Students.info,
+    'users.info':           lambda course, args: course.Users.info,
+    'assessments.info':     lambda course, args: course.Assessments.info,
+    'submissions.info':     lambda course, args: course.Assessments(FIRST_ASSESSMENT).Submissions.info,
+    'submission.info':      lambda course, args: submission_sample(course, args.sample, args.max_workers),
+    'exp_records.get_info': lambda course, args: course.ExpRecords.get_info(max_workers=args.max_workers),
+    'exp_records.info_fast': lambda course, args: course.ExpRecords.info_fast,
+    'groups.info':          lambda course, args: course.Groups.info,
+    'survey.info':          lambda course, args: course.Surveys(FIRST_SURVEY).info,
+    'students.stats':       lambda course, args: course.Users.Students.stats,
+}
+
+
+@contextlib.contextmanager
+def stub_server(args):
+    '''Starts the stand-in server in its own process, so that it does not share the GIL and the traced memory'''
+    command = [sys.executable, '-m', 'benchmarks.stub_server', '--students', str(args.students),
+               '--assessments', str(args.assessments), '--missions', str(args.missions),
+               '--records-per-student', str(args.records_per_student), '--page-size', str(args.page_size),
+               '--job-polls', str(args.job_polls), '--session-requests', str(args.session_requests)]
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True, cwd=root)
+    try:
+        yield process.stdout.readline().strip()
+    finally:
+        process.terminate()
+        process.wait()
+
+def connect(base, args):
+    '''Returns a `CourseAPI` on the stand-in server, signing in through its identity provider'''
+    coursemology_api.auth.AUTH_REALM_URL = base + REALM
+    coursemology_api.auth.URL = base + '/user/profile/edit'
+    course = CourseAPI(COURSE_ID, login_method='http', read_rate=args.read_rate, write_rate=args.write_rate)
+    course.URL_BASE = base
+    course.URL = f'{base}/courses/{COURSE_ID}'
+    course.URL_AUTH_CHECK = f'{base}/user/profile/edit{course.URL_FORMAT_JSON}'
+    return course
+
+def counters(base):
+    return requests.get(base + '/__stats').json()
+
+def rows(result):
+    data = getattr(result, 'data', result)
+    return len(data) if hasattr(data, '__len__') else None
+
+def measure(base, args, name):
+    walls, requests_count, logins, results = [], [], [], None
+    for _ in range(args.repeat):
+        course = connect(base, args)
+        before = counters(base)
+        start = time.perf_counter()
+        results = BENCHMARKS[name](course, args)
+        walls.append(time.perf_counter() - start)
+        after = counters(base)
+        requests_count.append(after.get('requests', 0) - before.get('requests', 0))
+        logins.append(after.get('logins', 0) - before.get('logins', 0))
+
+    peak = None
+    if args.memory:
+        course = connect(base, args)
+        tracemalloc.start()
+        BENCHMARKS[name](course, args)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    wall = statistics.median(walls)
+    count = rows(results)
+    return {
+        'benchmark': name,
+        'rows': count,
+        'wall_s': round(wall, 3),
+        'requests': requests_count[-1],
+        'logins': logins[-1],
+        'peak_mb': None if peak is None else round(peak / 2**20, 1),
+        'rows_per_s': None if count is None else round(count / wall),
+        'requests_per_s': round(requests_count[-1] / wall, 1),
+    }
+
+def main(argv=None):
+    arguments = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arguments.add_argument('--students', type=int, default=1000, help='e.g. 1000, 10000 or 50000')
+    arguments.add_argument('--assessments', type=int, default=200)
+    arguments.add_argument('--missions', type=int, default=20, help='assessments counted by students.stats')
+    arguments.add_argument('--records-per-student', type=int, default=2)
+    arguments.add_argument('--page-size', type=int, default=50, help='EXP records per page')
+    arguments.add_argument('--job-polls', type=int, default=1, help='202 responses before a job completes')
+    arguments.add_argument('--session-requests', type=int, default=0, help='requests before a 401, 0 for never')
+    arguments.add_argument('--sample', type=int, default=200, help='submissions fetched by submission.info')
+    arguments.add_argument('--max-workers', type=int, default=8)
+    arguments.add_argument('--read-rate', type=float, default=0, help='client rate limit of reads, 0 for none')
+    arguments.add_argument('--write-rate', type=float, default=0, help='client rate limit of mutations, 0 for none')
+    arguments.add_argument('--repeat', type=int, default=1, help='runs per benchmark, the median is reported')
+    arguments.add_argument('--no-memory', dest='memory', action='store_false', help='skip the tracemalloc run')
+    arguments.add_argument('--only', nargs='*', choices=list(BENCHMARKS), default=list(BENCHMARKS))
+    arguments.add_argument('--output', help='also write the results to this JSON file')
+    args = arguments.parse_args(argv)
+
+    output = os.path.abspath(args.output) if args.output else None
+    cwd = os.getcwd()
+    results = []
+    with stub_server(args) as base, tempfile.TemporaryDirectory() as workdir:
+        # the client keeps its login and cookies under the working directory
+        os.chdir(workdir)
+        try:
+            os.makedirs('.coursemology')
+            with open('.coursemology/login.json', 'w') as f:
+                json.dump({'username': USERNAME, 'password': PASSWORD}, f)
+            connect(base, args).login()
+            for name in args.only:
+                results.append(measure(base, args, name))
+                print(f"{name}: {results[-1]['wall_s']} s", flush=True)
+        finally:
+            os.chdir(cwd)
+
+    print(pd.DataFrame(results).to_string(index=False))
+    if output:
+        with open(output, 'w') as f:
+            json.dump({'arguments': vars(args), 'results': results}, f, indent=2)
+    return results
+
+if __name__ == '__main__':
+    main()
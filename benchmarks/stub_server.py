@@ -0,0 +1,457 @@
+'''
+Local stand-in for Coursemology serving a synthetic course, for benchmarking without coursemology.org.
+
+    python -m benchmarks.stub_server --students 10000 --port 8765
+
+The course is generated deterministically from `--seed`. It covers the JSON consumed by the user,
+assessment, submission, EXP record, group, survey and statistics accessors, paged EXP records, the
+`jobUrl` flow of the EXP record download, and the OpenID Connect login of `auth.get_auth_data_http`.
+With `--session-requests`, a session is rejected with 401 after that many requests, so the client
+has to sign in again. `GET /__stats` returns the request counters.
+'''
+import argparse
+import base64
+import collections
+import datetime
+import functools
+import itertools
+import json
+import random
+import re
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+COURSE_ID = 1
+REALM = '/realms/bench'
+USERNAME, PASSWORD = 'bench@example.com', 'bench'
+
+QUESTION_TYPES = ['TextResponse', 'MultipleChoice', 'Programming']
+STATES = ['published', 'graded', 'submitted', 'attempting']
+
+
+class StubCourse:
+    '''Synthetic course data. Large lists are generated on request and never kept in full.'''
+
+    def __init__(self, students=1000, assessments=200, missions=20, questions=3, records_per_student=2,
+                 page_size=50, group_size=15, surveys=5, job_polls=1, seed=0):
+        self.students = students
+        self.assessments = assessments
+        self.missions = min(missions, assessments)
+        self.questions = questions
+        self.records = students * records_per_student
+        self.page_size = page_size
+        self.group_size = group_size
+        self.surveys = surveys
+        self.job_polls = job_polls
+        self.seed = seed
+        self.start = datetime.datetime(2024, 1, 8, tzinfo=datetime.timezone.utc)
+
+    def rng(self, *key):
+        return random.Random(':'.join(map(str, (self.seed,) + key)))
+
+    def time(self, hours):
+        return (self.start + datetime.timedelta(hours=hours)).isoformat().replace('+00:00', 'Z')
+
+    # users
+
+    def user_ids(self):
+        return range(1, self.students + 1)
+
+    def student(self, user_id):
+        return {'id': user_id, 'name': f'Student {user_id:05d}', 'email': f'student{user_id}@example.com',
+                'timelineAlgorithm': 'fixed', 'phantom': user_id % 50 == 0, 'role': 'student'}
+
+    def student_list(self):
+        return {'users': [self.student(user_id) for user_id in self.user_ids()]}
+
+    def staff_list(self):
+        return {'users': self.staff()}
+
+    def staff(self):
+        return [{'id': 10**7 + i, 'name': f'Tutor {i:04d}', 'email': f'tutor{i}@example.com',
+                 'timelineAlgorithm': 'fixed', 'phantom': False, 'role': 'teaching_assistant'}
+                for i in range(1, max(1, self.students // 40) + 1)]
+
+    def tutor_of(self, user_id):
+        return f'Tutor {(user_id - 1) // 40 + 1:04d}'
+
+    def student_statistics(self):
+        return {'students': [{
+            'nameLink': f'/courses/{COURSE_ID}/users/{user_id}', 'name': self.student(user_id)['name'],
+            'groupManagers': [{'name': self.tutor_of(user_id)}], 'level': user_id % 20,
+            'experiencePoints': user_id * 7 % 5000, 'videoSubmissionCount': user_id % 9,
+            'videoPercentWatched': user_id % 100, 'studentType': 'Phantom' if user_id % 50 == 0 else 'Normal',
+        } for user_id in self.user_ids()]}
+
+    # assessments
+
+    def assessment_ids(self):
+        return range(1001, 1001 + self.assessments)
+
+    def assessment_title(self, assessment_id):
+        k = assessment_id - 1000
+        return f'Mission {k}: Synthetic' if k <= self.missions else f'Training {k}: Synthetic'
+
+    def assessment_list(self):
+        return {'display': {'category': {'id': 1, 'title': 'Missions', 'tabs': [{'id': 1, 'title': 'Default'}]}, 'tabId': 1},
+                'assessments': [{
+                    'id': assessment_id, 'title': self.assessment_title(assessment_id),
+                    'hasPersonalTimes': False, 'affectsPersonalTimes': False, 'published': True,
+                    'baseExp': 100, 'timeBonusExp': 20, 'topConditionals': [],
+                    'startAt': {'referenceTime': self.time(assessment_id)},
+                    'bonusEndAt': {'referenceTime': self.time(assessment_id + 72)},
+                    'endAt': {'referenceTime': self.time(assessment_id + 168)},
+                } for assessment_id in self.assessment_ids()]}
+
+    def submission_id(self, assessment_id, user_id):
+        return assessment_id * 10**6 + user_id
+
+    def submission_state(self, assessment_id, user_id):
+        rng = self.rng('submission', assessment_id, user_id)
+        return STATES[rng.randrange(len(STATES))], rng.randrange(self.questions * 10 + 1)
+
+    def submission_list(self, assessment_id):
+        submissions = []
+        for user_id in self.user_ids():
+            state, grade = self.submission_state(assessment_id, user_id)
+            graded = state in ('published', 'graded')
+            user = self.student(user_id)
+            submissions.append({
+                'id': self.submission_id(assessment_id, user_id), 'workflowState': state,
+                'courseUser': {'id': user_id, 'name': user['name'], 'isStudent': True, 'phantom': user['phantom']},
+                'grade': grade if graded else None, 'pointsAwarded': grade * 4 if state == 'published' else None,
+                'dateSubmitted': self.time(assessment_id + 24) if state != 'attempting' else None,
+                'dateGraded': self.time(assessment_id + 48) if graded else None,
+            })
+        return {'assessment': {'title': self.assessment_title(assessment_id), 'maximumGrade': self.questions * 10},
+                'submissions': submissions}
+
+    def submission(self, submission_id):
+        assessment_id, user_id = divmod(submission_id, 10**6)
+        state, grade = self.submission_state(assessment_id, user_id)
+        rng = self.rng('answers', submission_id)
+        questions, answers = [], []
+        for q in range(1, self.questions + 1):
+            question_type = QUESTION_TYPES[q % len(QUESTION_TYPES)]
+            answer_id = submission_id * 10 + q
+            question = {'id': q, 'submissionQuestionId': answer_id, 'questionTitle': f'Question {q}', 'answerId': answer_id,
+                        'maximumGrade': 10, 'type': question_type}
+            answer = {'id': answer_id, 'createdAt': self.time(assessment_id + 12),
+                      'grading': {'grade': str(float(rng.randrange(11)))}, 'attachments': []}
+            if question_type == 'MultipleChoice':
+                question['options'] = [{'id': q * 10 + k, 'option': f'Option {k}'} for k in range(4)]
+                answer['fields'] = {'option_ids': [q * 10 + rng.randrange(4)]}
+                answer['explanation'] = {'correct': rng.random() < 0.5}
+            elif question_type == 'Programming':
+                answer['fields'] = {'files_attributes': [{'id': answer_id, 'content': 'def f(x):\n    return x\n' * 20}]}
+                answer['testCases'] = {kind: [{'passed': rng.random() < 0.8} for _ in range(5)]
+                                       for kind in ('public_test', 'private_test', 'evaluation_test')}
+            else:
+                answer['fields'] = {'answer_text': 'Lorem ipsum dolor sit amet. ' * 20}
+            questions.append(question)
+            answers.append(answer)
+        return {
+            'submission': {'workflowState': state, 'submitter': self.student(user_id)['name'], 'grader': 'Tutor 0001',
+                           'attemptedAt': self.time(assessment_id + 1), 'submittedAt': self.time(assessment_id + 24),
+                           'gradedAt': self.time(assessment_id + 48), 'dueAt': self.time(assessment_id + 168),
+                           'bonusEndAt': self.time(assessment_id + 72), 'grade': grade, 'maximumGrade': self.questions * 10,
+                           'basePoints': 100, 'bonusPoints': 20, 'pointsAwarded': grade * 4, 'late': user_id % 7 == 0,
+                           'showPublicTestCasesOutput': True, 'showStdoutAndStderr': False},
+            'assessment': {'title': self.assessment_title(assessment_id), 'categoryId': 1, 'tabId': 1,
+                           'questionIds': list(range(1, self.questions + 1)), 'files': []},
+            'questions': questions, 'answers': answers, 'posts': [],
+        }
+
+    # EXP records, newest first
+
+    def record(self, index):
+        user_id = index % self.students + 1
+        record_id = self.records - index
+        manual = index % 3 == 0
+        return {'id': record_id,
+                'reason': {'text': 'Forum participation' if manual else self.assessment_title(1001 + index % self.assessments),
+                           'isManuallyAwarded': 'false' if manual else 'true',
+                           'link': f'/courses/{COURSE_ID}/assessments/{1001 + index % self.assessments}'},
+                'updater': {'id': 10**7 + 1, 'name': 'Tutor 0001'},
+                'student': {'id': user_id, 'name': self.student(user_id)['name']},
+                'pointsAwarded': index * 13 % 500, 'updatedAt': self.time(10**5 - index / 100)}
+
+    def record_page(self, page_num):
+        first = (page_num - 1) * self.page_size
+        return {'records': [self.record(i) for i in range(first, min(first + self.page_size, self.records))],
+                'rowCount': self.records}
+
+    def record_csv(self):
+        lines = ['Record ID,Reason,Experience Points Awarded,User ID,User Name,Updated At']
+        for i in range(self.records):
+            record = self.record(i)
+            lines.append(f"{record['id']},{record['reason']['text']},{record['pointsAwarded']},"
+                         f"{record['student']['id']},{record['student']['name']},{record['updatedAt']}")
+        return '\n'.join(lines) + '\n'
+
+    # groups, in categories of 20 groups
+
+    def group_category_ids(self):
+        return range(1, -(-self.students // (self.group_size * 20)) + 1)
+
+    def group_categories(self):
+        return {'groupCategories': [{'id': category_id} for category_id in self.group_category_ids()]}
+
+    def group_category(self, category_id):
+        groups = []
+        for g in range((category_id - 1) * 20, category_id * 20):
+            members = [{'id': user_id, 'name': self.student(user_id)['name'], 'groupRole': 'normal', 'isPhantom': user_id % 50 == 0}
+                       for user_id in range(g * self.group_size + 1, min((g + 1) * self.group_size, self.students) + 1)]
+            if members:
+                members.append({'id': 10**7 + g // 3 + 1, 'name': self.tutor_of(members[0]['id']), 'groupRole': 'manager',
+                                'isPhantom': False})
+                groups.append({'id': g + 1, 'name': f'Group {g + 1}', 'members': members})
+        return {'groupCategory': {'id': category_id, 'name': f'Category {category_id}'}, 'groups': groups}
+
+    # surveys
+
+    def survey_meta(self, survey_id):
+        return {'id': survey_id, 'title': f'Survey {survey_id}', 'base_exp': 50, 'time_bonus_exp': 0,
+                'published': True, 'start_at': self.time(0), 'end_at': self.time(1000), 'bonus_end_at': None,
+                'closing_reminded_at': None, 'anonymous': False, 'allow_response_after_end': False,
+                'allow_modify_after_submit': True, 'description': '', 'canUpdate': True, 'canDelete': True,
+                'canCreateSection': True, 'canRespond': False, 'hasStudentResponse': True}
+
+    def survey_list(self):
+        return {'surveys': [self.survey_meta(survey_id) for survey_id in range(1, self.surveys + 1)]}
+
+    def survey_responses(self, survey_id):
+        responses = []
+        for user_id in self.user_ids():
+            user = self.student(user_id)
+            present = (user_id + survey_id) % 5 != 0
+            responses.append({'course_user': {'id': user_id, 'name': user['name'], 'phantom': user['phantom']},
+                              'present': present, 'submitted_at': self.time(500) if present and user_id % 3 else None})
+        return {'survey': self.survey_meta(survey_id), 'responses': responses}
+
+    def survey_results(self, survey_id):
+        respondents = [user_id for user_id in self.user_ids() if (user_id + survey_id) % 5 != 0]
+        options = [{'id': k, 'option': f'Choice {k}'} for k in range(1, 6)]
+        return {'sections': [{'weight': 1, 'questions': [
+            {'id': 1, 'weight': 1, 'description': 'How was the course?', 'options': options,
+             'answers': [{'course_user_id': user_id, 'question_option_ids': [user_id % 5 + 1]} for user_id in respondents]},
+            {'id': 2, 'weight': 2, 'description': 'Any comments?', 'options': [],
+             'answers': [{'course_user_id': user_id, 'text_response': f'Comment from {user_id}'} for user_id in respondents]},
+        ]}]}
+
+
+class StubServer(ThreadingHTTPServer):
+
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self, address, course, session_requests=0):
+        super().__init__(address, StubHandler)
+        self.course = course
+        self.session_requests = session_requests
+        self.lock = threading.Lock()
+        self.counters = collections.Counter()
+        self.sessions = {}
+        self.codes = {}
+        self.jobs = {}
+        self.ids = itertools.count(1)
+
+    @property
+    def base(self):
+        return f'http://{self.server_address[0]}:{self.server_address[1]}'
+
+    def count(self, *keys):
+        with self.lock:
+            self.counters.update(keys)
+
+    def new_session(self):
+        with self.lock:
+            token = f's{next(self.ids)}'
+            self.sessions[token] = self.session_requests or None
+        return token
+
+    def use_session(self, token):
+        '''Counts a request against the session, and returns whether the session is still valid'''
+        with self.lock:
+            if token not in self.sessions:
+                return False
+            if self.sessions[token] is not None:
+                self.sessions[token] -= 1
+                if self.sessions[token] < 0:
+                    del self.sessions[token]
+                    return False
+            return True
+
+    @functools.lru_cache(maxsize=32)
+    def body(self, kind, *args):
+        '''Encoded response of `course.<kind>(*args)`, the recent ones kept to spare the encoding'''
+        data = getattr(self.course, kind)(*args)
+        return data.encode() if isinstance(data, str) else json.dumps(data).encode()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    ROUTES = [
+        (r'/students', 'student_list'),
+        (r'/staff', 'staff_list'),
+        (r'/statistics/students', 'student_statistics'),
+        (r'/assessments', 'assessment_list'),
+        (r'/assessments/(\d+)/submissions', 'submission_list'),
+        (r'/assessments/(\d+)/submissions/(\d+)/edit', 'submission'),
+        (r'/experience_points_records', 'record_page'),
+        (r'/experience_points_records/download', 'record_download'),
+        (r'/groups', 'group_categories'),
+        (r'/groups/(\d+)/info', 'group_category'),
+        (r'/surveys', 'survey_list'),
+        (r'/surveys/(\d+)/responses', 'survey_responses'),
+        (r'/surveys/(\d+)/results', 'survey_results'),
+    ]
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, status, body=b'', content_type='application/json', headers={}):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode()
+        elif isinstance(body, str):
+            body = body.encode()
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_form(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return dict(urllib.parse.parse_qsl(self.rfile.read(length).decode()))
+
+    def do_GET(self):
+        url = urllib.parse.urlparse(self.path)
+        query = urllib.parse.parse_qs(url.query)
+        server, course = self.server, self.server.course
+        if url.path == '/__stats':
+            with server.lock:
+                return self.reply(200, dict(server.counters))
+        server.count('requests', 'GET')
+        if url.path.startswith(REALM):
+            return self.identity_provider(url, query)
+
+        if url.path == '/downloads/experience_points_records.csv':
+            # a signed download link, like those of finished jobs, needs no session
+            return self.reply(200, server.body('record_csv'), 'text/csv')
+
+        cookies = dict(item.strip().split('=', 1) for item in (self.headers.get('Cookie') or '').split(';') if '=' in item)
+        if url.path == '/user/profile/edit' and self.headers.get('Authorization', '').startswith('Bearer '):
+            token = server.new_session()
+            return self.reply(200, {'user': {'name': 'Bench'}},
+                              headers={'Set-Cookie': f'_coursemology_session={token}; Path=/; HttpOnly'})
+        if not server.use_session(cookies.get('_coursemology_session')):
+            server.count('401')
+            return self.reply(401, {'error': 'You need to sign in or sign up before continuing.'})
+        if url.path == '/csrf_token':
+            return self.reply(200, {'csrfToken': 'bench'})
+        if url.path.startswith('/jobs/'):
+            return self.job(url.path[len('/jobs/'):])
+
+        prefix = f'/courses/{COURSE_ID}'
+        for pattern, kind in self.ROUTES if url.path.startswith(prefix) else []:
+            match = re.fullmatch(pattern, url.path[len(prefix):])
+            if match is None:
+                continue
+            if kind == 'record_download':
+                return self.record_download()
+            args = [int(group) for group in match.groups()][-1:]
+            if kind == 'record_page':
+                args = [int(query.get('filter[page_num]', ['1'])[0])]
+            return self.reply(200, server.body(kind, *args))
+        server.count('404')
+        self.reply(404, {'error': 'Not found'})
+
+    def do_POST(self):
+        url = urllib.parse.urlparse(self.path)
+        self.server.count('requests', 'POST')
+        if url.path.startswith(REALM):
+            return self.identity_provider(url, {}, self.read_form())
+        self.read_form()
+        self.reply(404, {'error': 'Not found'})
+
+    # background jobs
+
+    def record_download(self):
+        job_id = str(next(self.server.ids))
+        with self.server.lock:
+            self.server.jobs[job_id] = 0
+        self.reply(200, {'jobUrl': f'/jobs/{job_id}'})
+
+    def job(self, job_id):
+        with self.server.lock:
+            polls = self.server.jobs.get(job_id)
+            if polls is not None:
+                self.server.jobs[job_id] += 1
+        if polls is None:
+            return self.reply(404, {'error': 'Not found'})
+        if polls < self.server.course.job_polls:
+            self.server.count('202')
+            return self.reply(202, {'status': 'submitted', 'jobUrl': f'/jobs/{job_id}'})
+        self.reply(200, {'status': 'completed', 'redirectUrl': self.server.base + '/downloads/experience_points_records.csv'})
+
+    # OpenID Connect login, as in `auth.get_auth_data_http`
+
+    def identity_provider(self, url, query, form=None):
+        server, base = self.server, self.server.base + REALM
+        path = url.path[len(REALM):]
+        if path == '/.well-known/openid-configuration':
+            return self.reply(200, {'authorization_endpoint': base + '/auth', 'token_endpoint': base + '/token'})
+        if path == '/auth':
+            session_code = str(next(server.ids))
+            with server.lock:
+                server.codes[session_code] = query['state'][0]
+            return self.reply(200, f'<form id="kc-form-login" action="{base}/login-actions/authenticate?'
+                                   f'session_code={session_code}&amp;tab_id=bench" method="post"></form>', 'text/html')
+        if path == '/login-actions/authenticate':
+            session_code = urllib.parse.parse_qs(url.query).get('session_code', [''])[0]
+            if (form.get('username'), form.get('password')) != (USERNAME, PASSWORD) or session_code not in server.codes:
+                return self.reply(200, '<form action="login-actions/authenticate"></form>', 'text/html')
+            server.count('logins')
+            state = server.codes.pop(session_code)
+            return self.reply(302, headers={'Location': f'{server.base}/auth/callback?state={state}&code=bench'})
+        if path == '/token':
+            claims = base64.urlsafe_b64encode(json.dumps({'exp': int(time.time()) + 3600}).encode()).decode().rstrip('=')
+            return self.reply(200, {'access_token': 'bench', 'id_token': f'bench.{claims}.bench'})
+        self.reply(404, {'error': 'Not found'})
+
+
+def main(argv=None):
+    arguments = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arguments.add_argument('--host', default='127.0.0.1')
+    arguments.add_argument('--port', type=int, default=0)
+    arguments.add_argument('--students', type=int, default=1000)
+    arguments.add_argument('--assessments', type=int, default=200)
+    arguments.add_argument('--missions', type=int, default=20)
+    arguments.add_argument('--questions', type=int, default=3)
+    arguments.add_argument('--records-per-student', type=int, default=2)
+    arguments.add_argument('--page-size', type=int, default=50)
+    arguments.add_argument('--surveys', type=int, default=5)
+    arguments.add_argument('--job-polls', type=int, default=1)
+    arguments.add_argument('--session-requests', type=int, default=0)
+    arguments.add_argument('--seed', type=int, default=0)
+    args = arguments.parse_args(argv)
+
+    course = StubCourse(students=args.students, assessments=args.assessments, missions=args.missions,
+                        questions=args.questions, records_per_student=args.records_per_student,
+                        page_size=args.page_size, surveys=args.surveys, job_polls=args.job_polls, seed=args.seed)
+    server = StubServer((args.host, args.port), course, session_requests=args.session_requests)
+    print(server.base, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -1 +1,2 @@
-from .course import *
\ No newline at end of file
+from .course import *
+from .asynchronous import AsyncCourseAPI, AsyncHTTP
@@ -5,7 +5,7 @@ class Achievements(Rooted):
     URL = 'achievements'
 
     @property
-    @lru_cache(maxsize=1)
+    @cached()
     def info(self):
         response = self.HTTP.get(self.URL + self.URL_FORMAT_JSON, headers={'X-Csrf-Token': self.auth_token})
         headers = ['Achievement ID', 'Name', 'Description']
@@ -24,7 +24,7 @@ class Achievements(Rooted):
 
 class Achievement(Rooted):
     @property
-    @lru_cache(maxsize=1)
+    @cached()
     def info(self):
         response = self.HTTP.get(self.URL + self.URL_FORMAT_JSON, headers={'X-Csrf-Token': self.auth_token})
         headers = ['Student ID', 'Student Name']
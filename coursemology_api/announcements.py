@@ -5,7 +5,7 @@ class Announcements(Rooted):
     URL = 'announcements'
 
     @property
-    @lru_cache(maxsize=1)
+    @cached()
     def info(self):
         response = self.HTTP.get(self.URL + self.URL_FORMAT_JSON)
         headers = ['Announcement ID', 'Title', 'Start Date', 'End Date', 'Content']
@@ -46,7 +46,7 @@ class Announcements(Rooted):
 
 class Announcement(Rooted):
     @property
-    @lru_cache(maxsize=1)
+    @cached()
     def info(self):
         pass # TODO: Think about what kind of info to return. Blank table but with meta?
 
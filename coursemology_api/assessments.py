@@ -1,12 +1,10 @@
 from .utility import *
-import io
 import zipfile
-import json
-import time
-import requests
 import os
 from collections import defaultdict
 
+import numpy as np
+
 
 class Assessments(Rooted):
 
@@ -18,7 +16,7 @@ class Assessments(Rooted):
         self.Submissions = Submissions(self)
 
     @property
-    @lru_cache(maxsize=1)
+    @cached()
     def info(self):
         """
         As of now, self.URL will redirect to Missions and therefore unable to get the category and
@@ -95,6 +93,15 @@ class Assessments(Rooted):
                 ])
         return Table(headers=headers, data=data)
 
+    def submission_stats(self, *assessments):
+        '''
+        Exports the submission statistics of several assessments at once, and waits for the
+        export jobs together. Returns a dictionary of assessment ID to `Table`.
+        '''
+        submissions = [self(assessment).Submissions for assessment in assessments]
+        jobs = Job.wait_all([s.start_stats() for s in submissions])
+        return {s.id: s.read_stats(job) for s, job in zip(submissions, jobs)}
+
     @guess_id
     @lru_cache(maxsize=None)
     def __call__(self, id):
@@ -108,11 +115,11 @@ class Assessment(Rooted):
         self.Submissions = Submissions(self)
 
     @property
-    @lru_cache(maxsize=1)
+    @cached()
     def info(self):
         response = self.HTTP.get(self.URL + self.URL_FORMAT_JSON)
         assert response.ok, f'Response not OK, status code is {response.status_code}'
-        json_object = json.loads(response.content)
+        json_object = response.json()
 
         headers = ['Question ID', 'Question Name', 'Question Type',
                    'Question URL', 'Question Duplication ID']
@@ -170,28 +177,27 @@ class Assessment(Rooted):
             response = self.HTTP.get(url + self.URL_FORMAT_JSON)
             assert response.ok, response.status_code
             download_url = response.json()['url']
-            file_response = self.HTTP.get(download_url)
-            with open(f'{directory}/{filename}', 'wb') as f:
-                f.write(file_response.content)
+            self.HTTP.download(download_url, f'{directory}/{filename}')
         return directory
 
     def download_tests(self, directory=None):
         '''Downloads test packages'''
         directory = f"data/{self.course_id}/tests/{str2path(self.info.meta['name'])}" if directory is None else directory
         os.makedirs(directory, exist_ok=True)
-        for i, (question_id, question_name, question_type, question_url) in enumerate(self.info.data):
+        for i, (question_id, question_name, question_type, question_url, *_) in enumerate(self.info.data):
             if question_name == '':
                 question_name = f'Question {i+1}'
             if question_type == 'Programming':
                 response = self.HTTP.get(question_url + self.URL_FORMAT_JSON)
-                json_object = json.loads(response.content)
+                json_object = response.json()
                 if json_object['question']['package'] is None:
                     continue
                 package = self.URL_BASE + \
                     json_object['question']['package']['path']
-                response = self.HTTP.get(package)
-                zip_document = zipfile.ZipFile(io.BytesIO(response.content))
-                zip_document.extractall(directory + f'/{question_name}')
+                zip_path = self.HTTP.download(package, directory + f'/{question_id}.zip')
+                with zipfile.ZipFile(zip_path) as zip_document:
+                    zip_document.extractall(directory + f'/{question_name}')
+                os.remove(zip_path)
         return directory
 
     def move(self, target_tab_id):
@@ -264,10 +270,10 @@ class Submissions(Rooted):
         return self.info_pending
 
     @property
-    @lru_cache(maxsize=1)
+    @cached(mirror=True)
     def info_assessment(self):
         response = self.HTTP.get(self.URL + self.URL_FORMAT_JSON)
-        json_object = json.loads(response.content)
+        json_object = response.json()
 
         headers = ['Submission ID', 'User Name', 'User ID', 'Student',
                    'Submission Status', 'Grade', 'Max Grade', 'Exp',
@@ -307,7 +313,7 @@ class Submissions(Rooted):
         return Table(headers=headers, data=data, meta=meta)
 
     @property
-    @lru_cache(maxsize=1)
+    @cached()
     def info_pending(self):
         meta = None
         records = []
@@ -340,77 +346,174 @@ class Submissions(Rooted):
 
                 records.append(record)
             i += 1
-        df = pd.DataFrame.from_records(records)
-        return Table(headers=df.columns.to_list(), data=df.values.tolist(), meta=meta)
+        return Table.from_df(pd.DataFrame.from_records(records), meta=meta)
 
     @property
-    @lru_cache(maxsize=1)
+    @cached()
     def stats(self):
+        return self.read_stats(self.start_stats().wait())
+
+    def start_stats(self):
+        '''Starts the export of the submission statistics, see `read_stats`'''
+        return Job(self.HTTP, self.HTTP.get(self.URL_STATS + self.URL_FORMAT_JSON))
+
+    def read_stats(self, job):
         import csv
-        import time
-        response = self.HTTP.get(self.URL_STATS + self.URL_FORMAT_JSON)
-        response_json = response.json()
-        job_url = None
-        while True:
-            if 'redirectUrl' in response_json:
-                redirect_url = response_json['redirectUrl']
-                with self.HTTP.get(self.URL_BASE + redirect_url, stream=True) as r:
-                    lines = (line.decode('utf-8') for line in r.iter_lines())
-                    reader = csv.reader(lines)
-                    headers = next(reader)
-                    data = [line for line in reader]
-                return Table(headers=headers, data=data)
-            elif 'jobUrl' in response_json:
-                time.sleep(1)
-                if not job_url:
-                    job_url = response_json['jobUrl']
-                response = self.HTTP.get(
-                    f"{self.URL_BASE}{job_url}" + self.URL_FORMAT_JSON)
-                response_json = response.json()
-            elif 'error' in response_json:
-                return Table(headers=[], data=[])
-            else:
-                raise Exception('Any other cases to consider??')
+        if job.failed:
+            return Table(headers=[], data=[])
+        with self.HTTP.get(self.URL_BASE + job.redirect_url, stream=True) as r:
+            lines = (line.decode('utf-8') for line in r.iter_lines())
+            reader = csv.reader(lines)
+            headers = next(reader)
+            data = [line for line in reader]
+        return Table(headers=headers, data=data)
 
     @property
-    @lru_cache(maxsize=1)
+    @cached()
     def outputs(self):
         raise NotImplementedError # TODO
 
     def download(self, directory=None, max_workers=None):
         '''Downloads all graded submissions'''
-        import concurrent.futures
         directory = f"data/{self.course_id}/submissions/{str2path(self.info.meta['assessment_name'])}" if directory is None else directory
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = []
-            for row in self.info.data:
-                submission_id, submission_name, submitted_at = row[0], row[1], row[8]
-                filename = f"{self.course_id}.{self.id}.{submission_id}.{str2path(submission_name)}.csv"
-                if submitted_at is not None:
-                    executor.submit(self(submission_id).download,
-                                    filename=filename, directory=directory)
+        rows = [row for row in self.info.data if row[8] is not None]
+
+        def download(row):
+            submission_id, submission_name = row[0], row[1]
+            filename = f"{self.course_id}.{self.id}.{submission_id}.{str2path(submission_name)}.csv"
+            return self(submission_id).download(filename=filename, directory=directory)
+
+        with self.HTTP.priority(self.HTTP.BACKGROUND):
+            results = parallel_map(download, rows, max_workers=max_workers)
+        for row, (_, error) in zip(rows, results):
+            if error is not None:
+                print("WARNING! Failed to download submission:", row[0], row[1], repr(error))
         return directory
 
-    def download_all(self, directory=None, check_interval=3):
+    def fetch_all(self, max_workers=8, progress_bar=False):
+        '''Fetches the details of every submission concurrently into a single table'''
+        rows = [row for row in self.info.data if row[0] is not None]
+        with self.HTTP.priority(self.HTTP.BACKGROUND):
+            results = parallel_map(lambda row: self(row[0]).info, rows,
+                                   max_workers=max_workers, progress_bar=progress_bar)
+
+        headers = ['Submission ID', 'User ID', 'User Name'] + Submission.HEADERS
+        data = []
+        errors = {}
+        for row, (table, error) in zip(rows, results):
+            if error is not None:
+                errors[row[0]] = error
+                continue
+            data.extend([row[0], row[2], row[1], *datum] for datum in table.data)
+        if errors:
+            print(f"WARNING! Failed to fetch {len(errors)} submission(s):", list(errors))
+        meta = {**self.info.meta, 'errors': errors}
+        return Table(headers=headers, data=data, meta=meta)
+
+    def download_all(self, directory=None, check_interval=3, progress_bar=False):
         '''Downloads all submissions as zip'''
-        import concurrent.futures
         directory = f"data/{self.course_id}/submissions/{str2path(self.info.meta['assessment_name'])}" if directory is None else directory
         os.makedirs(directory, exist_ok=True)
         download_url = self.URL + '/download_all' + self.URL_FORMAT_JSON + '&course_users=students&download_format=zip'
-        response = self.HTTP.get(download_url)
-        while True:
-            response_json = response.json()
-            if response_json['status'] == 'completed':
-                break
-            time.sleep(check_interval)
-            response = self.HTTP.get(self.URL_BASE + response_json['jobUrl'] + self.URL_FORMAT_JSON)
-        zip_file_url = response_json['redirectUrl']
-        response = requests.get(zip_file_url)
-        z = zipfile.ZipFile(io.BytesIO(response.content))
-        z.extractall(directory)
+        with self.HTTP.priority(self.HTTP.BACKGROUND):
+            job = Job(self.HTTP, self.HTTP.get(download_url), max_delay=check_interval).wait()
+            zip_file_url = job.redirect_url
+            zip_path = self.HTTP.download(zip_file_url, f'{directory}/{self.id}.zip', progress_bar=progress_bar)
+        with zipfile.ZipFile(zip_path) as z:
+            z.extractall(directory)
+        os.remove(zip_path)
         return directory
 
-    @lru_cache(maxsize=1)
+    def grade_bulk(self, sheet, multiplier=1.0, publish=False, max_workers=8, progress_bar=False):
+        '''
+        Grades the submissions of this assessment from `sheet`, a `DataFrame` or `Table` with a
+        `Submission ID` column and one grade column per question (or a list of `[submission_id, *grades]`
+        rows). An optional `Multiplier` column overrides `multiplier` per row. Submissions are fetched
+        concurrently, their EXP computed together, and only those whose grades or EXP change are sent.
+        Returns one row per submission with its `Method` (`Grade` or `Unchanged`) and whether it went `OK`.
+        '''
+        if isinstance(sheet, Table):
+            sheet = sheet.df
+        if isinstance(sheet, pd.DataFrame):
+            sheet = sheet.set_index('Submission ID' if 'Submission ID' in sheet.columns else sheet.columns[0])
+        else:
+            sheet = pd.DataFrame([list(row[1:]) for row in sheet], index=[row[0] for row in sheet])
+        multipliers = sheet.pop('Multiplier') if 'Multiplier' in sheet.columns else pd.Series(multiplier, index=sheet.index)
+        rows, parse_errors = [], []
+        for submission_id, grades, row_multiplier in zip(sheet.index, sheet.values.tolist(), multipliers):
+            try:
+                grades = [float(grade) for grade in grades if not pd.isna(grade)]
+                rows.append((int(submission_id), [int(grade) if grade.is_integer() else grade for grade in grades],
+                             float(row_multiplier)))
+                parse_errors.append(None)
+            except (TypeError, ValueError) as e:
+                # reported in the row of this submission, the other rows still go ahead
+                rows.append((submission_id, [], None))
+                parse_errors.append(e)
+
+        submissions = [None if parse_error is not None else self(submission_id)
+                       for (submission_id, _, _), parse_error in zip(rows, parse_errors)]
+        self.auth_token
+        results = parallel_map(lambda submission: None if submission is None else submission.info, submissions,
+                               max_workers=max_workers, progress_bar=progress_bar)
+        results = [(table, parse_error or error) for (table, error), parse_error in zip(results, parse_errors)]
+
+        report = []
+        valid = []
+        for i, ((submission_id, grades, row_multiplier), submission, (table, error)) in enumerate(zip(rows, submissions, results)):
+            total = None
+            if error is None:
+                try:
+                    # an empty row keeps the existing grades, as in `grade()`
+                    grades = grades or [None if row[7] is None else float(row[7]) for row in table.data]
+                    assert table.meta['max_grade'] > 0, f"EXP cannot be computed for a maximum grade of {table.meta['max_grade']}"
+                    submission.grade_formdata(tuple(grades), multiplier=row_multiplier, exp=0)
+                    total = sum(grades)
+                    rows[i] = (submission_id, grades, row_multiplier)
+                    valid.append(i)
+                except (AssertionError, TypeError, ValueError) as e:
+                    error = e
+            report.append({'Submission ID': submission_id, 'Total Grade': total, 'EXP': None, 'Method': 'Grade',
+                           'OK': error is None, 'Error': None if error is None else repr(error)})
+
+        metas = [submissions[i].info.meta for i in valid]
+        exps = compute_exp(np.array([report[i]['Total Grade'] for i in valid], dtype=float),
+                           np.array([meta['max_grade'] for meta in metas], dtype=float),
+                           np.array([meta['base_exp'] for meta in metas], dtype=float),
+                           np.array([meta['bonus_exp'] for meta in metas], dtype=float),
+                           np.array([meta['is_late'] for meta in metas], dtype=bool),
+                           np.array([rows[i][2] for i in valid], dtype=float))
+
+        tasks = []
+        for i, meta, exp in zip(valid, metas, exps.tolist()):
+            submission, grades = submissions[i], rows[i][1]
+            report[i]['EXP'] = exp
+            existing = [row[7] for row in submission.info.data]
+            unchanged = exp == meta['awarded_exp'] and \
+                all(old is not None and float(old) == float(new) for old, new in zip(existing, grades)) and \
+                not (publish and meta['status'] != Submission.STATUS_PUBLISHED)
+            if unchanged:
+                report[i]['Method'] = 'Unchanged'
+            else:
+                tasks.append((i, submission.grade_formdata(tuple(grades), publish=publish, exp=exp)))
+
+        headers = {"X-Csrf-Token": self.auth_token}
+        def patch(task):
+            submission = submissions[task[0]]
+            return submission.HTTP.patch(submission.URL + submission.URL_FORMAT_JSON, data=task[1],
+                                         headers=headers, allow_redirects=False)
+
+        for (i, _), (response, error) in zip(tasks, parallel_map(patch, tasks, max_workers=max_workers)):
+            report[i]['OK'] = error is None and response.ok
+            report[i]['Error'] = repr(error) if error is not None else None if response.ok else f'Status code {response.status_code}'
+            submission = submissions[i]
+            submission.__dict__.pop('_info_json', None)
+            type(submission).info.fget.cache_clear(submission)
+        if tasks:
+            type(self).info_assessment.fget.cache_clear(self)
+        return pd.DataFrame.from_records(report)
+
+    @cached(maxsize=2)
     def pending(self, my_students=False):
         URL_MY_STUDENTS = '&my_students=' + ('true' if my_students else 'false')
         url = f'{self.URL}/pending{self.URL_FORMAT_JSON}{URL_MY_STUDENTS}'
@@ -422,6 +525,16 @@ class Submissions(Rooted):
         return Submission(self, id)
 
 
+def compute_exp(total_grades, max_grade, base_exp, bonus_exp, is_late, multiplier):
+    '''
+    EXP awarded for `total_grades` out of `max_grade`, for numbers or element-wise for numpy arrays.
+    Raises `ValueError` if a `max_grade` is not positive.
+    '''
+    if not np.all(np.greater(max_grade, 0)):
+        raise ValueError(f'max_grade must be positive to compute EXP. Was given {max_grade}')
+    exp = np.where(is_late, base_exp, np.add(base_exp, bonus_exp))
+    return np.round(np.multiply(multiplier, exp) * total_grades / max_grade).astype(int)
+
 class Submission(Rooted):
 
     TYPE_MCQ = 'MultipleChoice'
@@ -432,18 +545,23 @@ class Submission(Rooted):
     TYPE_AUDIO = 'AudioResponse'  # unhandled, unverified identifier
     TYPE_SCRIBE = 'Scribing'     # unhandled, unverified identifier
 
+    HEADERS = ['Submission Question ID', 'Question Name', 'Question ID', 'Question Type',
+               'Answer ID', 'Answer', 'Answer Meta Info', 'Grade', 'Max Grade',
+               'Tests Passed Count', 'Tests Total Count', 'Submission Created At',
+               'Answer Option ID', 'Answer Correct', 'Test Cases']
+
     def set_info_json(self):
         response = self.HTTP.get(self.URL + '/edit' + self.URL_FORMAT_JSON)
-        self._info_json = json.loads(response.content)
+        self._info_json = response.json()
 
     @property
-    @lru_cache(maxsize=1)
+    @cached()
     def info(self):
         try:
             json_object = self._info_json
         except Exception as e:
             response = self.HTTP.get(self.URL + '/edit' + self.URL_FORMAT_JSON)
-            json_object = json.loads(response.content)
+            json_object = response.json()
         submission = defaultdict(str, json_object['submission'])
         assessment = json_object['assessment']
         questions = {q['id']: q for q in json_object['questions']}
@@ -480,10 +598,7 @@ class Submission(Rooted):
 
         meta['posts'] = json_object['posts']
 
-        headers = ['Submission Question ID', 'Question Name', 'Question ID', 'Question Type',
-                   'Answer ID', 'Answer', 'Answer Meta Info', 'Grade', 'Max Grade',
-                   'Tests Passed Count', 'Tests Total Count', 'Submission Created At',
-                   'Answer Option ID', 'Answer Correct', 'Test Cases']
+        headers = list(self.HEADERS)
 
         data = []
         extras = []
@@ -576,14 +691,14 @@ class Submission(Rooted):
             ])
 
             # response = self.HTTP.get(f'{self.root.root.URL}/submission_questions/{submission_question_id}/past_answers' + self.URL_FORMAT_JSON)
-            # extra['past_answers'] = json.loads(response.content)
+            # extra['past_answers'] = response.json()
 
             extras.append(extra)
         meta['extras'] = extras
         return Table(headers=headers, data=data, meta=meta)
 
     @property
-    @lru_cache(maxsize=1)
+    @cached()
     def outputs(self):
         raise NotImplementedError # TODO
 
@@ -604,11 +719,14 @@ class Submission(Rooted):
 
     def compute_exp(self, total_grades, multiplier):
         meta = self.info.meta
-        exp = meta['base_exp']
-        exp = exp if meta['is_late'] else exp + meta['bonus_exp']
-        return round(multiplier * exp * total_grades / meta['max_grade'])
-
-    def grade(self, *grades, multiplier=1.0, publish=False):
+        return int(compute_exp(total_grades, meta['max_grade'], meta['base_exp'], meta['bonus_exp'],
+                               meta['is_late'], multiplier))
+
+    def grade_formdata(self, grades=(), multiplier=1.0, publish=False, exp=None):
+        '''
+        Returns the form data sent by `grade`, after checking `grades` against the maximum grades.
+        `exp` is computed with `compute_exp` unless given.
+        '''
         assert 0 <= multiplier <= 1.0, f'multiplier must be in the range [0.0, 1.0]. Was given {multiplier}'
         answer_ids, existing_grades, max_grades = zip(
             *[(row[4], row[7], row[8]) for row in self.info.data])
@@ -622,13 +740,17 @@ class Submission(Rooted):
 
         exp_type = 'points_awarded' if self.info.meta[
             'status'] == self.STATUS_PUBLISHED else 'draft_points_awarded'
-        formdata = [(f'[submission][{exp_type}]',
-                     self.compute_exp(sum(grades), multiplier))]
+        exp = self.compute_exp(sum(grades), multiplier) if exp is None else exp
+        formdata = [(f'[submission][{exp_type}]', exp)]
         for grade, answer_id, max_grade in zip(grades, answer_ids, max_grades):
             formdata.append(('[submission][answers][][id]', answer_id))
             formdata.append(('[submission][answers][][grade]', grade))
         if publish and self.info.meta['status'] != self.STATUS_PUBLISHED:
             formdata.append(('[submission][publish]', True))
+        return formdata
+
+    def grade(self, *grades, multiplier=1.0, publish=False):
+        formdata = self.grade_formdata(grades, multiplier=multiplier, publish=publish)
         headers = {"X-Csrf-Token": self.auth_token}
         return self.HTTP.patch(self.URL + self.URL_FORMAT_JSON, data=formdata, headers=headers, allow_redirects=False)
 
@@ -678,6 +800,3 @@ class Submission(Rooted):
             f'/answers/{answer_id}/programming/files/{file_id}/annotations' + \
             self.URL_FORMAT_JSON
         return self.HTTP.post(target_url, data=None, json=payload, headers=headers, allow_redirects=False)
-
-    def flush_cache(self):
-        self.__class__.info.fget.cache_clear()
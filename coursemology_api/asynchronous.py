@@ -0,0 +1,113 @@
+import asyncio
+import concurrent.futures
+import contextvars
+import functools
+import time
+
+from .utility import *
+from .course import CourseAPI
+
+class AsyncHTTP:
+    '''
+    asyncio counterpart of `HTTP`, sharing the session and cookies of the given `HTTP` instance.
+
+    Requests are run on a thread pool, at most `concurrency` at a time. The `redirect` semantics
+    are kept: a 401 signs in again (once, however many requests were rejected) and a 202 is
+    retried with backoff without blocking the event loop.
+    '''
+
+    def __init__(self, http, concurrency=32):
+        self.http = http
+        self.concurrency = concurrency
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=concurrency)
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.sign_in_lock = asyncio.Lock()
+
+    async def run(self, func, *args, **kwargs):
+        '''Runs a blocking call on the thread pool, within the concurrency limit.'''
+        async with self.semaphore:
+            loop = asyncio.get_running_loop()
+            call = functools.partial(contextvars.copy_context().run, func, *args, **kwargs)
+            return await loop.run_in_executor(self.executor, call)
+
+    async def request(self, method, *args, **kwargs):
+        send = getattr(HTTP, method).__wrapped__
+        delays = backoff()
+        deadline = time.monotonic() + self.http.job_timeout
+        while True:
+            generation = await self.run(self.http.check_session)
+            response = await self.run(send, self.http, *args, **kwargs)
+            if response.status_code == 401:
+                async with self.sign_in_lock:
+                    await self.run(self.http.renew, generation, retry=kwargs.get('tag') == 'retry_sign_in')
+                response = await self.run(send, self.http, *args, **kwargs)
+            if response.status_code == 422 and await self.run(self.http.replace_csrf_token, response, args, kwargs):
+                response = await self.run(send, self.http, *args, **kwargs)
+            if response.status_code != 202:
+                return response
+            if time.monotonic() > deadline:
+                raise TimeoutError(f'Job still processing after {self.http.job_timeout} seconds: {response.url}')
+            delay = next(delays)
+            print(f'Processing job... Retrying in {delay:.1f} seconds.')
+            await asyncio.sleep(delay)
+
+    async def get(self, url, data=None, **kwargs):
+        return await self.request('get', url, data=data, **kwargs)
+
+    async def post(self, url, data, **kwargs):
+        return await self.request('post', url, data, **kwargs)
+
+    async def patch(self, url, data, **kwargs):
+        return await self.request('patch', url, data, **kwargs)
+
+    async def put(self, url, data, **kwargs):
+        return await self.request('put', url, data, **kwargs)
+
+    async def delete(self, url, data=None, **kwargs):
+        return await self.request('delete', url, data=data, **kwargs)
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+class AsyncCourseAPI:
+    '''
+    asyncio facade of `CourseAPI`. Resources are reached the same way as on `CourseAPI`, and
+    awaiting the result evaluates it on the thread pool of `AsyncHTTP`, e.g.
+
+        await course.Assessments(54980).Submissions.info
+    '''
+
+    def __init__(self, course_id, concurrency=32, **kwargs):
+        self.course = CourseAPI(course_id, **kwargs)
+        self.HTTP = AsyncHTTP(self.course.HTTP, concurrency=concurrency)
+
+    def __getattr__(self, name):
+        return Awaitable(self, ((name, None, None),))
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exception_type, exception_value, traceback):
+        self.HTTP.close()
+
+class Awaitable:
+    '''Records attribute accesses and calls on a `CourseAPI`, and replays them when awaited.'''
+
+    def __init__(self, api, path):
+        self.api = api
+        self.path = path
+
+    def __getattr__(self, name):
+        return Awaitable(self.api, self.path + ((name, None, None),))
+
+    def __call__(self, *args, **kwargs):
+        return Awaitable(self.api, self.path + ((None, args, kwargs),))
+
+    def resolve(self):
+        result = self.api.course
+        for name, args, kwargs in self.path:
+            result = getattr(result, name) if name is not None else result(*args, **kwargs)
+        return result
+
+    def __await__(self):
+        return self.api.HTTP.run(self.resolve).__await__()
@@ -1,14 +1,77 @@
-from selenium import webdriver
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.common.by import By
-from selenium.webdriver.firefox.options import Options
+import base64
+import hashlib
+import html
 import json
+import re
+import secrets
+import urllib.parse
 import requests
 import os
 
+from .config import AUTH_REALM_URL, AUTH_CLIENT_ID, AUTH_REDIRECT_URI
+
+URL = 'https://coursemology.org/user/profile/edit'
+
+def get_auth_data_http(username, password, session=None, wait_time=10):
+    '''
+    Signs in with plain HTTP requests, following the same OpenID Connect authorization code flow
+    (with PKCE) as the Coursemology web app, and returns the cookies and `id_token` like `get_auth_data`.
+    '''
+    session = session or requests.Session()
+    config = session.get(AUTH_REALM_URL + '/.well-known/openid-configuration', timeout=wait_time).json()
+
+    verifier = secrets.token_urlsafe(64)
+    challenge = base64.urlsafe_b64encode(hashlib.sha256(verifier.encode('ascii')).digest()).decode('ascii').rstrip('=')
+    state = secrets.token_urlsafe(16)
+    response = session.get(config['authorization_endpoint'], timeout=wait_time, params={
+        'client_id': AUTH_CLIENT_ID,
+        'redirect_uri': AUTH_REDIRECT_URI,
+        'response_type': 'code',
+        'scope': 'openid',
+        'state': state,
+        'code_challenge': challenge,
+        'code_challenge_method': 'S256',
+    })
+    form = re.search(r'<form[^>]*action="([^"]*login-actions/authenticate[^"]*)"', response.text)
+    if form is None:
+        raise Exception('Login form not found on the identity provider page')
+
+    response = session.post(html.unescape(form.group(1)), timeout=wait_time, allow_redirects=False, data={
+        'username': username,
+        'password': password,
+        'rememberMe': 'on',
+        'credentialId': '',
+    })
+    query = urllib.parse.parse_qs(urllib.parse.urlparse(response.headers.get('Location', '')).query)
+    if 'code' not in query:
+        raise Exception('Login rejected, check the username and password')
+    if query.get('state') != [state]:
+        raise Exception('Login response does not match the request')
+
+    tokens = session.post(config['token_endpoint'], timeout=wait_time, data={
+        'grant_type': 'authorization_code',
+        'client_id': AUTH_CLIENT_ID,
+        'code': query['code'][0],
+        'redirect_uri': AUTH_REDIRECT_URI,
+        'code_verifier': verifier,
+    }).json()
+    # visit an authenticatable page, otherwise cookies are not set
+    response = session.get(URL + '?format=json', timeout=wait_time,
+                           headers={'Authorization': f"Bearer {tokens['access_token']}"})
+    if not response.ok:
+        raise Exception(f'Coursemology did not accept the login, status code is {response.status_code}')
+    return {
+        'cookies': [{'name': cookie.name, 'value': cookie.value, 'expiry': cookie.expires} for cookie in session.cookies],
+        'token': tokens['id_token']
+    }
+
 def get_auth_data(username, password, wait_time=10, headless=True):
-    URL = 'https://coursemology.org/user/profile/edit'
+    from selenium import webdriver
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.firefox.options import Options
+
     options = Options()
     if headless:
         # options.add_argument('--headless=new')
@@ -34,16 +97,35 @@ def get_auth_data(username, password, wait_time=10, headless=True):
             'token': id_token
         }
 
-def authenticate(username, password, wait_time=10, headless=True, session=None, retry_limit=3):
+def get_auth_data_browser(username, password, wait_time=10, headless=True, retry_limit=3):
+    from selenium.common.exceptions import WebDriverException
     for i in range(retry_limit):
         try:
-            auth_data = get_auth_data(username, password, wait_time=wait_time, headless=headless)
-            break
-        except selenium.common.exceptions.WebDriverException as e:
+            return get_auth_data(username, password, wait_time=wait_time, headless=headless)
+        except WebDriverException as e:
             print(e)
             print('Retrying...')
-            continue
+    raise Exception(f'Browser login failed {retry_limit} times')
+
+def authenticate(username, password, wait_time=10, headless=True, session=None, retry_limit=3, method='auto'):
+    '''
+    Signs in and returns `session` with the Coursemology cookies and `id_token` set. `method` is
+    `'http'` for plain HTTP requests, `'browser'` for Firefox through Selenium, or `'auto'` to try
+    plain HTTP first and fall back to the browser.
+    '''
     session = session or requests.Session()
+    if method in ('auto', 'http'):
+        try:
+            # the cookies are set on `session` directly, with their domains
+            session.id_token = get_auth_data_http(username, password, session=session, wait_time=wait_time)['token']
+            return session
+        except Exception as e:
+            if method == 'http':
+                raise
+            print('HTTP login failed, falling back to the browser:', e)
+            session.cookies.clear()
+    auth_data = get_auth_data_browser(username, password, wait_time=wait_time, headless=headless, retry_limit=retry_limit)
     for cookie in auth_data['cookies']:
-        session.cookies.set(cookie['name'], cookie['value'])
+        session.cookies.set(cookie['name'], cookie['value'], expires=cookie.get('expiry'))
+    session.id_token = auth_data['token']
     return session
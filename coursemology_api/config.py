@@ -3,4 +3,12 @@ import os
 CREDENTIALS_DIR = '.coursemology'
 
 COOKIE_FILENAME = os.path.join(CREDENTIALS_DIR, 'cookie.json')
-LOGIN_FILENAME = os.path.join(CREDENTIALS_DIR, 'login.json')
\ No newline at end of file
+LOGIN_FILENAME = os.path.join(CREDENTIALS_DIR, 'login.json')
+SESSION_FILENAME = os.path.join(CREDENTIALS_DIR, 'session.json')
+HTTP_CACHE_DIR = os.path.join(CREDENTIALS_DIR, 'http_cache')
+SYNC_DIR = os.path.join(CREDENTIALS_DIR, 'sync')
+
+# OpenID Connect settings of the Coursemology web app, used to sign in without a browser
+AUTH_REALM_URL = 'https://auth.coursemology.org/realms/coursemology'
+AUTH_CLIENT_ID = 'frontend'
+AUTH_REDIRECT_URI = 'https://coursemology.org/auth/callback'
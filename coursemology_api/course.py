@@ -5,7 +5,7 @@ import pathlib
 from functools import lru_cache
 from collections import defaultdict
 
-from .config import COOKIE_FILENAME
+from .config import COOKIE_FILENAME, HTTP_CACHE_DIR
 
 from .utility import *
 from .achievements import Achievements
@@ -17,6 +17,7 @@ from .lesson_plan import LessonPlan
 from .announcements import Announcements
 from .levels import Levels
 from .forums import Forums
+from .mirror import Mirror
 
 class CourseAPI:
 
@@ -24,7 +25,10 @@ class CourseAPI:
     URL_FORMAT_JSON = f'?format=json'
     URL_AUTH_CHECK  = f'{URL_BASE}/user/profile/edit{URL_FORMAT_JSON}'
 
-    def __init__(self, course_id, login_headless=True, login_wait_time=30):
+    def __init__(self, course_id, login_headless=True, login_wait_time=30, login_method='auto', cache_ttl=None,
+                 http_cache=False, http_cache_max_size=256 * 2**20, http_cache_max_age=7 * 24 * 3600,
+                 job_timeout=600, pool_connections=10, pool_maxsize=32, max_retries=3, retry_backoff=0.5,
+                 timeout=(10, 120), read_rate=None, write_rate=None):
         self.URL = self.URL_BASE + f'/courses/{course_id}'
 
         self.course_id = course_id
@@ -32,12 +36,21 @@ class CourseAPI:
 
         self.login_headless = login_headless
         self.login_wait_time = login_wait_time
+        self.login_method = login_method
+        self.cache_ttl = cache_ttl
 
         self.include_phantoms = WithContext(self, False)
         self.include_all_assessments = WithContext(self, False)
         self.include_submissions_breakdown = WithContext(self, False)
 
-        self.HTTP = HTTP(self, COOKIE_FILENAME)
+        disk_cache = None
+        if http_cache:
+            cache_dir = HTTP_CACHE_DIR if http_cache is True else http_cache
+            disk_cache = DiskCache(cache_dir, max_size=http_cache_max_size, max_age=http_cache_max_age)
+        self.HTTP = HTTP(self, COOKIE_FILENAME, disk_cache=disk_cache, job_timeout=job_timeout,
+                         pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                         max_retries=max_retries, retry_backoff=retry_backoff, timeout=timeout,
+                         read_rate=read_rate, write_rate=write_rate)
         self.Achievements  = Achievements(self)
         self.Groups        = Groups(self)
         self.Surveys       = Surveys(self)
@@ -50,6 +63,7 @@ class CourseAPI:
         self.ExpRecords    = ExpRecords(self)
         self.Workbin       = None
         self.Notifications = None
+        self.Mirror        = None
 
     def login(self):
         response = self.HTTP.get(self.URL_AUTH_CHECK)
@@ -57,25 +71,47 @@ class CourseAPI:
         return self
 
     @property
-    @lru_cache(maxsize=1)
+    @cached()
     def info(self):
         response = self.HTTP.get(self.URL + self.URL_FORMAT_JSON)
         return response.json()['course']
 
+    def mirror(self, path, max_age=3600):
+        '''
+        Keeps the `info` tables of the course's collections in the SQLite database at `path`, and
+        serves `info` from it while the copy is at most `max_age` seconds old (`None` for no limit).
+        '''
+        if self.Mirror is not None:
+            self.Mirror.close()
+        self.Mirror = Mirror(self, path, max_age=max_age)
+        return self.Mirror
+
+    def record(self, path):
+        '''
+        Records every HTTP exchange of this course to a `Cassette` at `path`, until it is closed.
+        Use it as a context manager: `with course.record('run.jsonl.gz'): ...`
+        '''
+        return self.HTTP.use_cassette(Cassette(path, 'record'))
+
+    def replay(self, path, latency=None, latency_scale=1.0):
+        '''
+        Answers every HTTP request of this course from the `Cassette` at `path` instead of Coursemology,
+        waiting the recorded time times `latency_scale`, or `latency` seconds if given.
+        `course.HTTP.use_cassette(None)` goes back to the network.
+        '''
+        return self.HTTP.use_cassette(Cassette(path, 'replay', latency=latency, latency_scale=latency_scale))
+
     def upload(self, filepath):
         filepath = pathlib.Path(filepath)
-        with open(filepath, 'rb') as f:
-            filedata = f.read()
-        files = {'file': filedata}
-        data = {'name': filepath.name}
-        headers = {"X-Csrf-Token": self.auth_token}
-        resp = self.HTTP.post(self.URL_BASE + '/attachments', data=data, files=files, headers=headers)
+        with MultipartStream({'name': filepath.name}, 'file', filepath) as data:
+            headers = {"X-Csrf-Token": self.auth_token, "Content-Type": data.content_type}
+            resp = self.HTTP.post(self.URL_BASE + '/attachments', data=data, headers=headers)
         json_obj = resp.json()
         assert json_obj['success'], f"Upload failed: {filepath}"
         return '/attachments/' + json_obj['id']
 
     @property
-    @lru_cache(maxsize=1)
+    @cached()
     def auth_token(self):
         response = self.HTTP.get(self.URL_BASE + '/csrf_token' + self.URL_FORMAT_JSON)
         return response.json()['csrfToken']
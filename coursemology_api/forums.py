@@ -11,7 +11,7 @@ class Forums(Rooted):
     URL = 'forums'
 
     @property
-    @lru_cache(maxsize=1)
+    @cached()
     def info(self):
         return get_default_info_table(self, records_key='forums', meta_keys=[])
 
@@ -42,7 +42,7 @@ class Forum(Rooted):
         self.Topics = Topics(self)
 
     @property
-    @lru_cache(maxsize=1)
+    @cached()
     def info(self):
         return get_default_info_table(self, records_key='topics', meta_keys=['forum'])
 
@@ -98,7 +98,7 @@ class Topic(Rooted):
         self.Posts = Posts(self)
 
     @property
-    @lru_cache(maxsize=1)
+    @cached()
     def info(self):
         return get_default_info_table(self, records_key='posts', meta_keys=['topic'])
 
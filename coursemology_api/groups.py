@@ -5,44 +5,89 @@ class Groups(Rooted):
     URL = 'groups'
 
     @property
-    @lru_cache(maxsize=1)
+    @cached()
     def info(self): # CourseAPI(course_id).Groups.info
         '''
         Returns information about the groups in current course.
         '''
-        response = self.HTTP.get(self.URL + self.URL_FORMAT_JSON)
-        assert response.ok
-
         headers = ['Group ID', 'Name', 'Members',
                    'Phantom', 'Total', 'Managers', 'Category ID', 'Category Name']
         data = []
 
-        for category in response.json()['groupCategories']:
-            cat_id = category['id']
-
-            inner_response = self.HTTP.get(f'{self.URL}/{cat_id}/info' + self.URL_FORMAT_JSON)
-            assert inner_response.ok
-
-            groups = inner_response.json()['groups']
-            cat_name = inner_response.json()['groupCategory']['name']
-            for group in groups:
-                gid, name, all_members = group['id'], group['name'], group['members']
-                total = len(all_members)
-                members = [member['name'] for member in all_members if member['groupRole'] == 'normal']
-                phantom = [member['name'] for member in all_members if member['isPhantom']]
-                managers = [member['name'] for member in all_members if member['groupRole'] == 'manager']
-                data.append([gid, name, members, phantom, total, managers, cat_id, cat_name])
+        for gid, (cat_id, cat_name, group) in self.index.items():
+            name, all_members = group['name'], group['members']
+            total = len(all_members)
+            members = [member['name'] for member in all_members if member['groupRole'] == 'normal']
+            phantom = [member['name'] for member in all_members if member['isPhantom']]
+            managers = [member['name'] for member in all_members if member['groupRole'] == 'manager']
+            data.append([gid, name, members, phantom, total, managers, cat_id, cat_name])
 
         return Table(headers=headers, data=data)
 
-    def create(self, student_ids, tutor_ids, group_name, category_name, description=None):
+    @property
+    @cached()
+    def categories(self):
+        '''
+        Returns the info of every group category keyed by category ID, fetched concurrently.
+        '''
+        self.__dict__.pop('stale_categories', None)
         response = self.HTTP.get(self.URL + self.URL_FORMAT_JSON)
         assert response.ok
 
+        cat_ids = [category['id'] for category in response.json()['groupCategories']]
+        categories = {}
+        for cat_id, (category, error) in zip(cat_ids, parallel_map(self.get_category, cat_ids)):
+            if error is not None:
+                raise error
+            categories[cat_id] = category
+        return categories
+
+    @property
+    @cached()
+    def index(self):
+        '''
+        Returns a dictionary of group ID to `(category ID, category name, group)`, shared by all `Group` operations.
+        '''
+        categories = self.categories
+        stale = list(self.__dict__.pop('stale_categories', set()))
+        for cat_id, (category, error) in zip(stale, parallel_map(self.get_category, stale)):
+            if error is not None:
+                raise error
+            categories[cat_id] = category
+        return {group['id']: (cat_id, category['groupCategory']['name'], group)
+                for cat_id, category in categories.items() for group in category['groups']}
+
+    def get_category(self, cat_id):
+        response = self.HTTP.get(f'{self.URL}/{cat_id}/info' + self.URL_FORMAT_JSON)
+        assert response.ok
+        return response.json()
+
+    def category_of(self, group_id):
+        '''
+        Returns the category ID of a group. Groups never move between categories, so this does
+        not wait for changed categories to be refetched.
+        '''
+        for cat_id, category in self.categories.items():
+            if any(group['id'] == group_id for group in category['groups']):
+                return cat_id
+        try:
+            return self.index[group_id][0]
+        except KeyError:
+            raise Exception('Cannot find group with the given ID!')
+
+    def refresh_category(self, cat_id):
+        '''
+        Marks a category as changed. Only that category is refetched, on the next access of `index` or `info`.
+        '''
+        self.__dict__.setdefault('stale_categories', set()).add(cat_id)
+        self.__class__.index.fget.cache_clear(self)
+        self.__class__.info.fget.cache_clear(self)
+
+    def create(self, student_ids, tutor_ids, group_name, category_name, description=None):
         cat_id = None
-        for group_cat in response.json()['groupCategories']:
-            if group_cat['name'] == category_name:
-                cat_id = group_cat['id']
+        for group_cat_id, group_cat in self.categories.items():
+            if group_cat['groupCategory']['name'] == category_name:
+                cat_id = group_cat_id
                 break
 
         if cat_id == None:
@@ -52,7 +97,6 @@ class Groups(Rooted):
 
         headers = {"X-Csrf-Token": self.auth_token}
         json_payload = {'groups': [{'name': group_name, 'description': description}]}
-        self.flush_cache()
         response = self.HTTP.post(f'{self.URL}/{cat_id}/groups{self.URL_FORMAT_JSON}', data=None, json=json_payload, headers=headers, allow_redirects=False)
         assert response.ok
 
@@ -60,6 +104,7 @@ class Groups(Rooted):
             group_id = response.json()['groups'][0]['id']
         except IndexError:
             raise Exception('Group creation failed, group may have existed!')
+        self.refresh_category(cat_id)
         group = self(id=group_id)
         group.update(student_ids, tutor_ids=tutor_ids, group_name=group_name, description=description)
         return group
@@ -78,6 +123,7 @@ class Groups(Rooted):
         Deletes a group category.
         '''
         headers = {"X-Csrf-Token": self.auth_token}
+        self.flush_cache()
         return self.HTTP.delete(f'{self.URL}/{category_id}{self.URL_FORMAT_JSON}', headers=headers)
 
     @guess_id
@@ -91,54 +137,36 @@ class Group(Rooted):
     ROLE_STAFF = 'Manager'
 
     @property
-    @lru_cache(maxsize=1)
     def info(self):
         '''
         Returns information about this group.
         '''
-        parent_info_df = self.root.info.df
         try:
-            filtered_df = parent_info_df[parent_info_df['Group ID'] == self.id].iloc[0]
-        except:
+            _, _, group = self.root.index[self.id]
+        except KeyError:
             raise Exception('Cannot find group with the given ID!')
 
         headers = ['User ID', 'Name', 'Role']
         data = []
-        cat_id = filtered_df['Category ID']
-
-        response = self.HTTP.get(f'{self.root.URL}/{cat_id}/info' + self.URL_FORMAT_JSON)
-        assert response.ok
-
-        groups = response.json()['groups']
-        for group in groups:
-            gid, all_members = group['id'], group['members']
-            if gid == self.id:
-                for member in all_members:
-                    if member['groupRole'] == 'manager':
-                        data.append([member['id'], member['name'], self.ROLE_STAFF])
-                    else:
-                        data.append([member['id'], member['name'], self.ROLE_STUDENT])
+        for member in group['members']:
+            if member['groupRole'] == 'manager':
+                data.append([member['id'], member['name'], self.ROLE_STAFF])
+            else:
+                data.append([member['id'], member['name'], self.ROLE_STUDENT])
         return Table(headers=headers, data=data)
 
     def update(self, student_ids, tutor_ids=[], group_name=None, description=None):
         '''
         Updates the particulars of a specific group.
         '''
-        parent_info_df = self.root.info.df
-        try:
-            filtered_df = parent_info_df[parent_info_df['Group ID'] == self.id].iloc[0]
-        except:
-            raise Exception('Cannot find group with the given ID!')
-
+        cat_id = self.root.category_of(self.id)
         headers = {"X-Csrf-Token": self.auth_token}
-        cat_id = filtered_df['Category ID']
 
         # Update group name and description
         json_payload = {
             'name': group_name,
             'description': description
         }
-        self.flush_cache()
         response = self.HTTP.patch(f'{self.root.URL}/{cat_id}/groups/{self.id}{self.URL_FORMAT_JSON}', data=json_payload, headers=headers, allow_redirects=False)
         assert response.ok
 
@@ -163,19 +191,16 @@ class Group(Rooted):
                 'groupRole':    'manager'
             })
 
-        self.flush_cache()
-        return self.HTTP.patch(f'{self.root.URL}/{cat_id}/group_members' + self.URL_FORMAT_JSON, data=None, json=json_payload, headers=headers, allow_redirects=False)
+        response = self.HTTP.patch(f'{self.root.URL}/{cat_id}/group_members' + self.URL_FORMAT_JSON, data=None, json=json_payload, headers=headers, allow_redirects=False)
+        self.root.refresh_category(cat_id)
+        return response
 
     def delete(self):
         '''
         Deletes the group.
         '''
-        parent_info_df = self.root.info.df
-        try:
-            filtered_df = parent_info_df[parent_info_df['Group ID'] == self.id].iloc[0]
-        except:
-            raise Exception('Cannot find group with the given ID!')
-
+        cat_id = self.root.category_of(self.id)
         headers = {"X-Csrf-Token": self.auth_token}
-        cat_id = filtered_df['Category ID']
-        return self.HTTP.delete(f'{self.root.URL}/{cat_id}/groups/{self.id}{self.URL_FORMAT_JSON}', headers=headers)
\ No newline at end of file
+        response = self.HTTP.delete(f'{self.root.URL}/{cat_id}/groups/{self.id}{self.URL_FORMAT_JSON}', headers=headers)
+        self.root.refresh_category(cat_id)
+        return response
@@ -7,10 +7,10 @@ class LessonPlan(Rooted):
     URL = 'lesson_plan'
 
     @property
-    @lru_cache(maxsize=1)
+    @cached()
     def info(self):
         response = self.HTTP.get(self.URL + '/edit.json')
-        json_object = json.loads(response.content)
+        json_object = response.json()
 
         milestone_data = []
         for milestone in json_object['milestones']:
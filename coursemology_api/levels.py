@@ -5,13 +5,13 @@ class Levels(Rooted):
     URL = 'levels'
 
     @property
-    @lru_cache(maxsize=1)
+    @cached()
     def info(self): # CourseAPI(course_id).Levels.info
         '''
         Returns information about the exp to reach each level in current course.
         '''
         response = self.HTTP.get(self.URL + self.URL_FORMAT_JSON)
-        json_object = json.loads(response.content)
+        json_object = response.json()
         levels = json_object['levels']
         meta = {'can_manage': json_object['canManage']}
 
@@ -38,6 +38,3 @@ class Levels(Rooted):
         headers = {"X-Csrf-Token": self.auth_token}
         self.flush_cache()
         return self.HTTP.post(self.URL + self.URL_FORMAT_JSON, data=None, json=json_payload, headers=headers, allow_redirects=False)
-
-    def flush_cache(self):
-        self.__class__.info.fget.cache_clear()
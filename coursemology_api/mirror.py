@@ -0,0 +1,191 @@
+import sqlite3
+import urllib.parse
+
+from .utility import *
+from .users import ExpRecords
+from .assessments import Submissions
+
+class Mirror:
+    '''
+    Local SQLite copy of the `info` tables of the course's collections (users, assessments,
+    submissions lists, EXP records, groups, ...), one SQL table per resource with indexes on
+    its ID columns. While a copy is younger than `max_age` seconds, `info` is read from it
+    instead of Coursemology. Stale copies are fetched again and written back.
+    '''
+
+    CONTEXTS = ['include_phantoms', 'include_all_assessments', 'include_submissions_breakdown']
+
+    def __init__(self, course, path, max_age=3600):
+        self.course = course
+        self.path = path
+        self.max_age = max_age
+        self.lock = threading.RLock()
+        if os.path.dirname(path) != '':
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute('CREATE TABLE IF NOT EXISTS mirror_tables (name TEXT PRIMARY KEY, kind TEXT, '
+                                    'headers TEXT, dtypes TEXT, meta TEXT, refreshed_at REAL)')
+
+    def covers(self, resource):
+        '''Only collections are mirrored, e.g. `Submissions` of an assessment but not each `Submission`.'''
+        return isinstance(resource, Rooted) and 'id' not in resource.__dict__
+
+    def name(self, resource):
+        name = str2path(urllib.parse.urlparse(resource.URL).path)
+        return '_'.join([name] + [flag[len('include_'):] for flag in self.CONTEXTS if getattr(resource, flag)])
+
+    def is_fresh(self, resource, max_age=None):
+        max_age = self.max_age if max_age is None else max_age
+        with self.lock:
+            row = self.connection.execute('SELECT refreshed_at FROM mirror_tables WHERE name = ?',
+                                          (self.name(resource),)).fetchone()
+        return row is not None and (max_age is None or time.time() - row[0] <= max_age)
+
+    def load(self, resource):
+        '''
+        Returns the mirrored `info` of the resource, or `None` if it is missing or stale. Tables built
+        from rows come back as rows of the same Python values, with `None` for missing values, and
+        tables built from a DataFrame come back with the same column dtypes.
+        '''
+        if not self.is_fresh(resource):
+            return None
+        name = self.name(resource)
+        with self.lock:
+            row = self.connection.execute('SELECT headers, dtypes, meta FROM mirror_tables WHERE name = ?',
+                                          (name,)).fetchone()
+            if row is None:
+                return None
+            headers, dtypes, meta = row
+            dtypes = json.loads(dtypes)
+            if 'columns' not in dtypes:
+                # written by an older version
+                return None
+            if dtypes['frame']:
+                df = pd.read_sql_query(f'SELECT * FROM "{name}"', self.connection)
+            else:
+                data = [list(row) for row in self.connection.execute(f'SELECT * FROM "{name}"')]
+        headers, meta = json.loads(headers), json.loads(meta)
+        if not dtypes['frame']:
+            for i, kind in enumerate(dtypes['columns']):
+                if kind in ('bool', 'json'):
+                    decode = bool if kind == 'bool' else json.loads
+                    for row in data:
+                        row[i] = None if row[i] is None else decode(row[i])
+            return Table(headers=headers, data=data, meta=meta)
+        df.columns = headers
+        for column, dtype in zip(headers, dtypes['columns']):
+            if dtype == 'json':
+                df[column] = df[column].map(lambda value: None if value is None else json.loads(value))
+            elif dtype == 'object':
+                df[column] = df[column].astype(object).where(df[column].notna(), None)
+            elif dtype != str(df[column].dtype):
+                try:
+                    df[column] = df[column].astype(dtype)
+                except (TypeError, ValueError):
+                    pass
+        return Table.from_df(df, meta=meta)
+
+    def store(self, resource, table, kind=None):
+        '''
+        Writes the table as the copy of the resource. A table that SQLite cannot hold, e.g. one with
+        `ISODatetime` cells, is skipped with a warning, so that `info` never fails because of the mirror.
+        '''
+        if not isinstance(table, Table) or not table.headers or len(set(table.headers)) != len(table.headers):
+            return
+        name = self.name(resource)
+        try:
+            frame, dtypes, df = self.encode(table)
+            with self.lock, self.connection:
+                df.to_sql(name, self.connection, if_exists='replace', index=False)
+                for column in df.columns:
+                    if column == 'ID' or column.endswith(' ID'):
+                        self.connection.execute(f'CREATE INDEX IF NOT EXISTS "{name}__{str2path(column)}" '
+                                                f'ON "{name}" ("{column}")')
+                self.connection.execute('INSERT OR REPLACE INTO mirror_tables VALUES (?, ?, ?, ?, ?, ?)',
+                                        (name, kind, json.dumps(table.headers),
+                                         json.dumps({'frame': frame, 'columns': dtypes}),
+                                         json.dumps(table.meta, default=str), time.time()))
+        except Exception as e:
+            print(f"WARNING! Could not mirror {name}, it is fetched from Coursemology instead: {e}")
+            with self.lock, self.connection:
+                self.connection.execute('DELETE FROM mirror_tables WHERE name = ?', (name,))
+
+    PLAIN_TYPES = (str, int, float, bool, list, dict, np.number, np.bool_)
+
+    def encode(self, table):
+        '''Returns whether the table is built from a DataFrame, the kind of each column and the DataFrame to write.'''
+        frame = isinstance(table.data, Rows)
+        # rows are kept as Python objects, so that e.g. integer IDs with gaps are not turned into floats
+        df = table.df.copy() if frame else pd.DataFrame(list(table.data), columns=table.headers, dtype=object)
+        dtypes = []
+        for column in df.columns:
+            values = df[column]
+            if values.dtype == object:
+                unsupported = [value for value in values if value is not None and not isinstance(value, self.PLAIN_TYPES)]
+                if unsupported:
+                    raise TypeError(f'column {column!r} holds {type(unsupported[0]).__name__} values')
+            if values.dtype == object and values.map(lambda value: isinstance(value, (list, dict))).any():
+                dtypes.append('json')
+                df[column] = values.map(lambda value: None if value is None else json.dumps(value))
+            elif frame:
+                dtypes.append(str(values.dtype))
+            else:
+                present = [value for value in values if value is not None]
+                dtypes.append('bool' if present and all(isinstance(value, bool) for value in present) else None)
+        return frame, dtypes, df
+
+    def invalidate(self, resource=None, kind=None):
+        '''Marks the copy of one resource, or of every resource of a `kind` (e.g. `Students.info`), as stale.'''
+        with self.lock, self.connection:
+            if resource is not None:
+                self.connection.execute('UPDATE mirror_tables SET refreshed_at = 0 WHERE name = ?', (self.name(resource),))
+            if kind is not None:
+                self.connection.execute('UPDATE mirror_tables SET refreshed_at = 0 WHERE kind = ?', (kind,))
+
+    def refresh(self, max_age=None, max_workers=8, progress_bar=False):
+        '''
+        Fetches again the mirrored tables older than `max_age` (default `mirror.max_age`, 0 for all):
+        users, students, staff, assessments, groups, EXP records and the submissions list of every
+        assessment. EXP records are brought up to date with `exp_records.sync`. Returns the names of
+        the refreshed tables.
+        '''
+        course = self.course
+        resources = [course.Users, course.Users.Students, course.Users.Staff, course.Assessments, course.Groups,
+                     course.ExpRecords]
+
+        def refresh(resource):
+            if self.is_fresh(resource, max_age):
+                return None
+            fget = (type(resource).info_assessment if isinstance(resource, Submissions) else type(resource).info).fget
+            fget.cache_clear(resource)
+            if isinstance(resource, ExpRecords):
+                self.store(resource, resource.sync(), kind=fget.__qualname__)
+            else:
+                resource.info
+            return self.name(resource)
+
+        with course.HTTP.priority(course.HTTP.BACKGROUND):
+            results = parallel_map(refresh, resources, max_workers=max_workers)
+            submissions = [course.Assessments(row[0]).Submissions for row in course.Assessments.info.data]
+            results += parallel_map(refresh, submissions, max_workers=max_workers, progress_bar=progress_bar)
+        refreshed = []
+        for name, error in results:
+            if error is not None:
+                raise error
+            if name is not None:
+                refreshed.append(name)
+        return refreshed
+
+    def query(self, sql, params=()):
+        '''Runs an SQL query on the mirror and returns the result as a DataFrame.'''
+        with self.lock:
+            return pd.read_sql_query(sql, self.connection, params=params)
+
+    @property
+    def tables(self):
+        return self.query('SELECT name, kind, refreshed_at FROM mirror_tables ORDER BY name')
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
@@ -2,13 +2,14 @@ from .utility import *
 import contextlib
 import csv
 import codecs
+from collections import defaultdict
 
 class Surveys(Rooted):
 
     URL = 'surveys'
 
     @property
-    @lru_cache(maxsize=1)
+    @cached()
     def info(self):
         response = self.HTTP.get(self.URL + self.URL_FORMAT_JSON)
         surveys = response.json()['surveys']
@@ -51,7 +52,7 @@ class Survey(Rooted):
         self.URL_RESPONSES = self.URL + '/responses'
 
     @property
-    @lru_cache(maxsize=1)
+    @cached()
     def info(self):
         response = self.HTTP.get(self.URL_RESPONSES + self.URL_FORMAT_JSON)
         json_object = response.json()
@@ -77,7 +78,8 @@ class Survey(Rooted):
         meta['hasStudentResponse'] = json_object['survey']['hasStudentResponse']
         meta['anonymous'] = json_object['survey']['anonymous']
 
-        data = []
+        # built column by column and stored as a DataFrame, see `Table.from_df`
+        columns = [[], [], [], [], []]
         for resp in json_object['responses']:
             course_user = resp['course_user']
             is_phantom = course_user['phantom']
@@ -89,7 +91,9 @@ class Survey(Rooted):
                         self.IN_PROGRESS if resp['present'] else \
                         self.UNCOMMENCED
             submitted_at = resp['submitted_at'] if status == self.COMPLETED else ''
-            data.append([student_id, student_name, is_phantom, status, submitted_at])
+            for column, value in zip(columns, [student_id, student_name, is_phantom, status, submitted_at]):
+                column.append(value)
+        user_ids = columns[0]
 
         if meta['anonymous']:
             print("Survey is anonymous, fall-back to export the responses via download.")
@@ -104,13 +108,10 @@ class Survey(Rooted):
             for row in reader:
                 user_id = int(row[1])
                 data_table[user_id] = row[4:]
-            for row in data:
-                user_id = row[0]
-                if user_id in data_table:
-                    row.extend(data_table[user_id])
-                else:
-                    row.extend([''] * len(extra_headers))
-            return Table(headers=headers, data=data, meta=meta)
+            extra_rows = [data_table[user_id] if user_id in data_table else [''] * len(extra_headers)
+                          for user_id in user_ids]
+            columns.extend(map(list, zip(*extra_rows)) if extra_rows else [[] for _ in extra_headers])
+            return self.table(headers, columns, meta)
 
         response = self.HTTP.get(self.URL_RESULTS + self.URL_FORMAT_JSON)
         json_object = response.json()
@@ -133,10 +134,13 @@ class Survey(Rooted):
                         raise Exception("Unhandled response type: " + str(answer))
                     data_table[user_id][question['id']] = response
 
-        for row in data:
-            user_id = row[0]
-            if user_id in data_table:
-                row.extend([data_table[user_id][qid] for qid in header_ids])
-            else:
-                row.extend([''] * len(header_ids))
-        return Table(headers=headers, data=data, meta=meta)
+        for qid in header_ids:
+            columns.append([data_table[user_id][qid] if user_id in data_table else '' for user_id in user_ids])
+        return self.table(headers, columns, meta)
+
+    @staticmethod
+    def table(headers, columns, meta):
+        # question descriptions may repeat, so the columns are named only once the frame is built
+        df = pd.DataFrame(dict(enumerate(columns)), columns=range(len(columns)))
+        df.columns = headers
+        return Table.from_df(df, meta=meta)
@@ -1,6 +1,7 @@
 from .utility import *
+from .config import SYNC_DIR
 
-from tqdm_loggable.auto import tqdm
+import numpy as np
 
 class Users(Rooted):
 
@@ -13,7 +14,7 @@ class Users(Rooted):
         self.Staff = Staff(self, skip_url=True)
 
     @property
-    @lru_cache(maxsize=1)
+    @cached()
     def info(self):
         '''get both students and staff info'''
         headers = ['User ID', 'Name', 'Email',
@@ -21,9 +22,91 @@ class Users(Rooted):
         data = self.Staff.info.data + self.Students.info.data
         return Table(headers=headers, data=data)
 
-    def exp_disburse(self, reason_for_disbursement, student_id_exp_pairs=[], return_report=False):
+    # statuses that a single invalid pair can cause, so that splitting the request finds it
+    ROW_REJECTIONS = {400, 422}
+
+    def exp_disburse(self, reason_for_disbursement, student_id_exp_pairs=[], return_report=False,
+                     chunk_size=None, max_workers=4, checkpoint=None):
+        '''
+        Disburses EXP with a common reason. Without `return_report`, `chunk_size` and `checkpoint`, all
+        pairs are sent in one request and its response is returned.
+
+        Otherwise a report row is returned per pair. With `chunk_size`, the pairs are sent in chunks of
+        that size by `max_workers` threads. A chunk rejected for its rows (400 or 422) is split in halves until
+        the failing pairs are found, so every row has its own status. With `checkpoint`, the pairs already sent
+        are recorded in that JSON file and skipped when the same disbursement is run again. Pairs whose
+        request got no response or a 5xx status may or may not have been awarded; they are never sent
+        again, but recorded too and reported with `OK` set to `None`.
+        '''
+        chunked = return_report or chunk_size is not None or checkpoint is not None
         if len(student_id_exp_pairs) == 0:
-            return [] if return_report else None
+            return [] if chunked else None
+        if not chunked:
+            return self.post_disbursement(reason_for_disbursement, student_id_exp_pairs)
+
+        state = {'reason': reason_for_disbursement, 'done': [], 'unknown': []}
+        if checkpoint is not None and os.path.exists(checkpoint):
+            state = json_load(checkpoint)
+            assert state['reason'] == reason_for_disbursement, \
+                f"Checkpoint {checkpoint} belongs to the disbursement {state['reason']!r}"
+        sent = {key: collections.Counter(map(tuple, state[key])) for key in ('done', 'unknown')}
+        report, pairs = [], []
+        for student_id, exp in student_id_exp_pairs:
+            for key, ok in (('done', True), ('unknown', None)):
+                if sent[key][(student_id, exp)] > 0:
+                    sent[key][(student_id, exp)] -= 1
+                    report.append({'User ID': student_id, 'EXP': exp, 'Method': 'Checkpoint', 'OK': ok})
+                    break
+            else:
+                pairs.append((student_id, exp))
+
+        lock = threading.Lock()
+        def record(chunk, key):
+            if checkpoint is None:
+                return
+            with lock:
+                state[key].extend(chunk)
+                json_save(checkpoint + '.tmp', state)
+                os.replace(checkpoint + '.tmp', checkpoint)
+
+        def send(chunk):
+            try:
+                response = self.post_disbursement(reason_for_disbursement, chunk)
+            except Exception as e:
+                print("WARNING! No response for the disbursement to:", [student_id for student_id, _ in chunk], repr(e))
+                record(chunk, 'unknown')
+                return [None] * len(chunk)
+            if response.ok:
+                record(chunk, 'done')
+                return [True] * len(chunk)
+            if response.status_code >= 500:
+                # the records may have been saved before the error, so sending them again could award EXP twice
+                print("WARNING! Status code", response.status_code, "for the disbursement to:",
+                      [student_id for student_id, _ in chunk])
+                record(chunk, 'unknown')
+                return [None] * len(chunk)
+            if response.status_code not in self.ROW_REJECTIONS:
+                # e.g. 403 or 429 reject the whole request, whatever its rows
+                print("WARNING! Status code", response.status_code, "for the disbursement to:",
+                      [student_id for student_id, _ in chunk])
+                return [False] * len(chunk)
+            if len(chunk) == 1:
+                return [False]
+            middle = len(chunk) // 2
+            return send(chunk[:middle]) + send(chunk[middle:])
+
+        self.auth_token
+        size = chunk_size or len(pairs) or 1
+        chunks = [pairs[i:i + size] for i in range(0, len(pairs), size)]
+        for chunk, (statuses, error) in zip(chunks, parallel_map(send, chunks, max_workers=max_workers)):
+            statuses = [False] * len(chunk) if error is not None else statuses
+            report.extend({'User ID': student_id, 'EXP': exp, 'Method': 'Create', 'OK': ok}
+                          for (student_id, exp), ok in zip(chunk, statuses))
+        self.root.ExpRecords.flush_cache()
+        return report
+
+    def post_disbursement(self, reason_for_disbursement, student_id_exp_pairs):
+        '''Sends one disbursement form with all the given `(student_id, exp)` pairs.'''
         formdata = {
             'utf8': '✓',
             'authenticity_token': self.auth_token,
@@ -36,12 +119,10 @@ class Users(Rooted):
             formdata[f'{prefix}[{i}][course_user_id]'] = id_exp[0]
             formdata[f'{prefix}[{i}][points_awarded]'] = id_exp[1]
 
-        response = self.HTTP.post(self.URL + '/disburse_experience_points' + self.URL_FORMAT_JSON, data=formdata, allow_redirects=False)
-        if return_report:
-            return [{'User ID': student_id, 'EXP': exp, 'Method': 'Create', 'OK': response.ok} for student_id, exp in student_id_exp_pairs]
-        return response
+        return self.HTTP.post(self.URL + '/disburse_experience_points' + self.URL_FORMAT_JSON, data=formdata, allow_redirects=False)
 
-    def exp_disburse_override(self, reason_for_disbursement, student_id_exp_pairs=[], progress_bar=False):
+    def exp_disburse_override(self, reason_for_disbursement, student_id_exp_pairs=[], progress_bar=False, max_workers=8,
+                              chunk_size=None):
         exp_records_info = self.ExpRecords.get_info(progress_bar=progress_bar)
         df = exp_records_info.df[exp_records_info.df['Reason'] == reason_for_disbursement]
 
@@ -63,19 +144,38 @@ class Users(Rooted):
         )
         update_student_id_record_exp_pairs = update_df[['User ID', 'Record ID', 'EXP']].values.tolist() if update_df.shape[0] > 0 else []
 
-        create_result = self.exp_disburse(reason_for_disbursement, student_id_exp_pairs=create_student_id_exp_pairs, return_report=True)
-        update_result = self.exp_override(reason_for_disbursement, student_id_record_exp_pairs=update_student_id_record_exp_pairs)
+        create_result = self.exp_disburse(reason_for_disbursement, student_id_exp_pairs=create_student_id_exp_pairs, return_report=True,
+                                          chunk_size=chunk_size, max_workers=max_workers)
+        update_result = self.exp_override(reason_for_disbursement, student_id_record_exp_pairs=update_student_id_record_exp_pairs,
+                                          max_workers=max_workers)
         unchanged_result = [{'User ID': record['User ID'], 'Record ID': record['Record ID'], 'EXP': record['EXP'], 'Method': 'Unchanged', 'OK': True}
                             for record in unchanged_df.to_dict('records')]
 
         return pd.DataFrame.from_records(create_result + update_result + unchanged_result)
 
-    def exp_override(self, reason_for_disbursement, student_id_record_exp_pairs):
-        result = []
-        for student_id, record_id, exp in student_id_record_exp_pairs:
+    def exp_override(self, reason_for_disbursement, student_id_record_exp_pairs, max_workers=8, progress_bar=False):
+        '''
+        Updates the given EXP records concurrently with at most `max_workers` requests at a time, then
+        clears the cached EXP records once. Returns a report row per record, as in `exp_disburse_override`.
+        '''
+        student_id_record_exp_pairs = [tuple(item) for item in student_id_record_exp_pairs]
+        if len(student_id_record_exp_pairs) == 0:
+            return []
+        self.auth_token
+
+        def update(item):
+            student_id, record_id, exp = item
             record = self.Students(student_id).ExpRecords(record_id)
-            response = record.update(reason=reason_for_disbursement, exp=exp)
-            result.append({'User ID': student_id, 'Record ID': record_id, 'EXP': exp, 'Method': 'Update', 'OK': response.ok})
+            return record.update(reason=reason_for_disbursement, exp=exp, flush=False)
+
+        results = parallel_map(update, student_id_record_exp_pairs, max_workers=max_workers, progress_bar=progress_bar)
+        self.root.ExpRecords.flush_cache()
+        result = []
+        for (student_id, record_id, exp), (response, error) in zip(student_id_record_exp_pairs, results):
+            if error is not None:
+                print("WARNING! Failed to update EXP record:", record_id, repr(error))
+            result.append({'User ID': student_id, 'Record ID': record_id, 'EXP': exp, 'Method': 'Update',
+                           'OK': error is None and response.ok})
         return result
 
     def invite(self, data):
@@ -96,7 +196,7 @@ class Users(Rooted):
         return self.HTTP.post(self.URL + '/invite' + self.URL_FORMAT_JSON, data=formdata, allow_redirects=False)
 
     @property
-    @lru_cache(maxsize=1)
+    @cached()
     def invitations(self):
         response = self.HTTP.get(self.URL_INVITATIONS + '?format=json')
         assert response.ok, f'Response not OK, status code is {response.status_code}'
@@ -138,7 +238,7 @@ class User(Rooted):
         self.PersonalTimes = PersonalTimes(self)
 
     @property
-    @lru_cache(maxsize=1)
+    @cached()
     def info(self):
         raise Exception('TODO: maybe put random deets here?')
 
@@ -172,9 +272,10 @@ class Students(Rooted):
 
     URL = 'students'
     URL_STATS = 'statistics/students'
+    max_workers = 8
 
     @property
-    @lru_cache(maxsize=1)
+    @cached()
     def info(self):
         response = self.HTTP.get(self.URL + self.URL_FORMAT_JSON)
         assert response.ok, f'Response not OK, status code is {response.status_code}'
@@ -196,7 +297,7 @@ class Students(Rooted):
         return Table(headers=headers, data=data)
 
     @property
-    @lru_cache(maxsize=1)
+    @cached()
     def stats(self):
         response = self.HTTP.get(self.URL_STATS + self.URL_FORMAT_JSON)
         assert response.ok, f'Response not OK, status code is {response.status_code}'
@@ -205,12 +306,20 @@ class Students(Rooted):
         m_and_sq_df = assessment_df[assessment_df['Assessment Name'].str.startswith(
             ('Mission', 'Side Quest'))]
         m_and_sq_names = m_and_sq_df['Assessment Name']
-        m_and_sq_map = dict(
-            zip(m_and_sq_names, m_and_sq_df['Assessment ID'].astype(int)))
-        submission_dfs = [self.Assessments(
-            m_and_sq_map[name]).Submissions.info.df for name in m_and_sq_names]
-        submission_xp_map = [dict(zip(df['User ID'], df['Exp'].fillna(
-            '-').astype(str).apply(lambda x: str(int(float(x))) if x != '-' else x))) for df in submission_dfs]
+        m_and_sq_ids = m_and_sq_df['Assessment ID'].astype(int).to_list()
+
+        def get_exp(assessment_id):
+            df = self.Assessments(assessment_id).Submissions.info.df
+            return pd.DataFrame({'User ID': df['User ID'], 'Assessment ID': assessment_id,
+                                 'Exp': pd.to_numeric(df['Exp'], errors='coerce')})
+
+        exp_dfs = []
+        for exp_df, error in parallel_map(get_exp, m_and_sq_ids, max_workers=self.max_workers):
+            if error is not None:
+                raise error
+            exp_dfs.append(exp_df)
+        exp_df = pd.concat(exp_dfs) if exp_dfs else pd.DataFrame(columns=['User ID', 'Assessment ID', 'Exp'])
+        exp_matrix = exp_df.pivot_table(index='User ID', columns='Assessment ID', values='Exp', aggfunc='first')
 
         headers = ['User ID', 'Name', 'Tutors', 'Level',
                    'Exp', 'Videos Watched', 'Average % Watched', 'Phantom']
@@ -232,21 +341,17 @@ class Students(Rooted):
             num_vids = user['videoSubmissionCount']
             avg_watched = float(user['videoPercentWatched'] or 0)
             phantom = (user['studentType'] == 'Phantom')
-            assessment_xp = [xp_map.get(int(user_id), '-')
-                             for xp_map in submission_xp_map]
-            return [user_id, name, tutor, lvl, exp, num_vids, avg_watched, phantom, *assessment_xp]
+            return [user_id, name, tutor, lvl, exp, num_vids, avg_watched, phantom]
 
         data = [parse_user(user) for user in response.json()['students']]
+        user_exp = exp_matrix.reindex(index=[row[0] for row in data], columns=m_and_sq_ids).to_numpy(dtype=float)
+        user_exp = np.where(np.isnan(user_exp), '-', np.nan_to_num(user_exp).astype(np.int64).astype(str))
+        data = [row + assessment_xp for row, assessment_xp in zip(data, user_exp.tolist())]
         if not self.include_phantoms:
             # Phantom column is index 7
             data = list(filter(lambda u: not u[7], data))
         return Table(headers=headers, data=data)
 
-    @classmethod
-    def flush_cache(cls):
-        cls.info.fget.cache_clear()
-        cls.stats.fget.cache_clear()
-
     @guess_id
     @lru_cache(maxsize=None)
     def __call__(self, id):
@@ -259,7 +364,7 @@ class Staff(Rooted):
     URL_STATS = 'statistics/course/staff'
 
     @property
-    @lru_cache(maxsize=1)
+    @cached()
     def info(self):
         response = self.HTTP.get(self.URL + self.URL_FORMAT_JSON)
         assert response.ok, f'Response not OK, status code is {response.status_code}'
@@ -281,7 +386,7 @@ class Staff(Rooted):
         return Table(headers=headers, data=data)
 
     @property
-    @lru_cache(maxsize=1)
+    @cached()
     def stats(self):
         response = self.HTTP.get(self.URL + self.URL_FORMAT_JSON)
         assert response.ok, f'Info response not OK, status code is {response.status_code}'
@@ -319,62 +424,115 @@ class ExpRecords(Rooted):
     check_interval = 3
 
     @property
-    @lru_cache(maxsize=1)
+    @cached()
     def info(self):
         return self.get_info()
 
-    def get_info(self, progress_bar=False):
-        def get_data():
-            i = 1
-            pbar = tqdm(total=1) if progress_bar else None
-            data = []
-            while True:
-                response = self.HTTP.get(
-                    self.URL + f'?filter[page_num]={i}&format=json')
-                if response.json()['records'] == []:
-                    break
-                i += 1
-                response_json = response.json()
-                if pbar is not None:
-                    pbar.update(len(response_json['records'])/response_json['rowCount'])
-                for experiencePointRecord in response.json()['records']:
-                    record_id = experiencePointRecord['id']
-                    reason = experiencePointRecord['reason']['text']
-                    is_auto_disburse = experiencePointRecord['reason']['isManuallyAwarded'] == 'true'
-                    submission_url = self.URL_BASE + \
-                        experiencePointRecord['reason']['link'] if is_auto_disburse else ''
-                    updater_id = experiencePointRecord['updater']['id']
-                    updater_name = experiencePointRecord['updater']['name']
-                    student_id = experiencePointRecord['student']['id']
-                    student_name = experiencePointRecord['student']['name']
-                    exp = experiencePointRecord['pointsAwarded']
-                    timestamp = experiencePointRecord['updatedAt']
-                    data.append([record_id, reason, submission_url,
-                                exp, updater_id, updater_name, student_id, student_name, timestamp])
-            if pbar is not None:
-                pbar.close()
-            return data
-        headers = ['Record ID', 'Reason', 'Submission URL', 'Experience Points Awarded',
-                   'Updater ID', 'Updater Name', 'User ID', 'User Name', 'Updated at']
-
-        data = get_data()
-        return Table(headers=headers, data=data)
+    HEADERS = ['Record ID', 'Reason', 'Submission URL', 'Experience Points Awarded',
+               'Updater ID', 'Updater Name', 'User ID', 'User Name', 'Updated at']
+
+    def get_page(self, page_num):
+        response = self.HTTP.get(self.URL + f'?filter[page_num]={page_num}&format=json')
+        assert response.ok, f'Response not OK, status code is {response.status_code}'
+        return response.json()
+
+    def parse_records(self, records):
+        data = []
+        for experiencePointRecord in records:
+            record_id = experiencePointRecord['id']
+            reason = experiencePointRecord['reason']['text']
+            is_auto_disburse = experiencePointRecord['reason']['isManuallyAwarded'] == 'true'
+            submission_url = self.URL_BASE + \
+                experiencePointRecord['reason']['link'] if is_auto_disburse else ''
+            updater_id = experiencePointRecord['updater']['id']
+            updater_name = experiencePointRecord['updater']['name']
+            student_id = experiencePointRecord['student']['id']
+            student_name = experiencePointRecord['student']['name']
+            exp = experiencePointRecord['pointsAwarded']
+            timestamp = experiencePointRecord['updatedAt']
+            data.append([record_id, reason, submission_url,
+                        exp, updater_id, updater_name, student_id, student_name, timestamp])
+        return data
+
+    def get_info(self, progress_bar=False, max_workers=8):
+        '''
+        Fetches all EXP records. The number of pages is derived from the `rowCount` of the
+        first page, and the remaining pages are fetched concurrently.
+        '''
+        first_page = self.get_page(1)
+        records = first_page['records']
+        data = self.parse_records(records)
+        if records and 'rowCount' in first_page:
+            num_pages = -(-first_page['rowCount'] // len(records))
+            pages = parallel_map(self.get_page, range(2, num_pages + 1),
+                                 max_workers=max_workers, progress_bar=progress_bar)
+            for page, error in pages:
+                if error is not None:
+                    raise error
+                data.extend(self.parse_records(page['records']))
+        elif records:
+            page_num = 2
+            while records := self.get_page(page_num)['records']:
+                data.extend(self.parse_records(records))
+                page_num += 1
+        return Table.from_df(pd.DataFrame(data, columns=self.HEADERS))
+
+    def sync(self, path=None, full=False):
+        '''
+        Brings a local copy of the EXP records up to date and returns it as a `Table`.
+
+        The server lists the most recently updated records first, so only the pages down to the
+        newest `updatedAt` already stored (the high-water mark) are fetched, and the changed
+        records are merged by record ID. Deleted records are only dropped by a `full` sync.
+        '''
+        path = os.path.join(SYNC_DIR, str2path(self.URL[len(self.URL_BASE):]) + '.json') if path is None else path
+        if os.path.exists(path) and not full:
+            state = json_load(path)
+        else:
+            state = {'updated_at': None, 'record_ids': [], 'data': []}
+        high_water = parser.isoparse(state['updated_at']) if state['updated_at'] else None
+        known_at_high_water = set(state['record_ids'])
+
+        def is_new(row):
+            updated_at = parser.isoparse(row[8])
+            return high_water is None or updated_at > high_water or \
+                (updated_at == high_water and row[0] not in known_at_high_water)
+
+        changed = []
+        page_num = 1
+        while records := self.get_page(page_num)['records']:
+            rows = self.parse_records(records)
+            changed.extend(filter(is_new, rows))
+            if high_water is not None and parser.isoparse(rows[-1][8]) < high_water:
+                break
+            page_num += 1
+
+        records = {row[0]: row for row in state['data']}
+        records.update((row[0], row) for row in changed)
+        data = list(records.values())
+        updated_at = pd.to_datetime(pd.Series([row[8] for row in data], dtype=object), utc=True)
+        data = [data[i] for i in updated_at.argsort(kind='stable')[::-1]]
+        if data:
+            newest = updated_at.max()
+            state['updated_at'] = data[0][8]
+            state['record_ids'] = [record_id for record_id, t in zip(records, updated_at) if t == newest]
+        state['data'] = data
+
+        if os.path.dirname(path) != '':
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        json_save(path + '.tmp', state)
+        os.replace(path + '.tmp', path)
+        return Table.from_df(pd.DataFrame(data, columns=self.HEADERS), meta={'changed': len(changed), 'pages': page_num})
 
     @property
     def info_fast(self):
         if isinstance(self, User):
             raise NotImplementedError
         download_url = self.URL + '/download' + self.URL_FORMAT_JSON
-        response = self.HTTP.get(download_url)
-        while True:
-            response_json = response.json()
-            if response_json['status'] == 'completed':
-                break
-            time.sleep(self.check_interval)
-            response = self.HTTP.get(self.URL_BASE + response_json['jobUrl'] + self.URL_FORMAT_JSON)
-        file_url = response_json['redirectUrl']
-        df = pd.read_csv(file_url)
-        return Table(headers=df.columns.to_list(), data=df.values.tolist())
+        job = Job(self.HTTP, self.HTTP.get(download_url), max_delay=self.check_interval).wait()
+        response = self.HTTP.get(job.redirect_url)
+        assert response.ok, f'Response not OK, status code is {response.status_code}'
+        return Table.from_df(pd.read_csv(io.BytesIO(response.content)))
 
     @guess_id
     @lru_cache(maxsize=None)
@@ -384,11 +542,13 @@ class ExpRecords(Rooted):
 
 class ExpRecord(Rooted):
 
-    def update(self, reason='', exp=None):
+    def update(self, reason='', exp=None, flush=True):
+        '''Updates the record. With `flush=False` the cached EXP records are kept, for callers that clear them once after a batch.'''
         if exp is None:
             raise Exception(
                 'Need to supply `exp` argument to update exp record')
-        self.root.flush_cache()
+        if flush:
+            self.root.flush_cache()
         formdata = {'experience_points_record[points_awarded]': exp}
         if reason:
             formdata['experience_points_record[reason]'] = reason
@@ -411,7 +571,7 @@ class PersonalTimes(Rooted):
     URL = 'personal_times'
 
     @property
-    @lru_cache(maxsize=1)
+    @cached()
     def info(self):
         response = self.HTTP.get(self.URL + self.URL_FORMAT_JSON)
         assert response.ok, f'Response not OK, status code is {response.status_code}'
@@ -1,21 +1,52 @@
+import base64
+import bisect
 import dataclasses
+import difflib
+import gzip
+import hashlib
+import io
 import json
+import uuid
 import requests
 import time
+import random
 import re
 import os
 import csv
+import threading
+import weakref
+import collections.abc
+import concurrent.futures
+import contextlib
+import contextvars
+import heapq
+import itertools
+import numpy as np
 import pandas as pd
 
-from functools import lru_cache
+from functools import lru_cache, wraps
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from collections import OrderedDict
 from dateutil import tz, parser
 from datetime import datetime, timezone, timedelta
 from getpass import getpass
 from collections.abc import MutableMapping
+from tqdm_loggable.auto import tqdm
 
 from .auth import authenticate
 
-from .config import COOKIE_FILENAME, LOGIN_FILENAME
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    try:
+        import ujson
+        json_loads = ujson.loads
+    except ImportError:
+        json_loads = json.loads
+
+from .config import COOKIE_FILENAME, LOGIN_FILENAME, SESSION_FILENAME
 
 @dataclasses.dataclass
 class WithContext:
@@ -44,16 +75,74 @@ class WithContext:
         self.new_value = new_value
         return self
 
+class Rows(collections.abc.Sequence):
+    '''
+    Read-only view of a DataFrame as a list of rows, used as `Table.data` of a `Table.from_df`.
+    Rows are converted to tuples of Python objects only when they are accessed. They are tuples
+    so that assigning to a cell fails instead of being silently lost; edit `Table.df` instead.
+    '''
+
+    CHUNK_SIZE = 4096
+
+    def __init__(self, df):
+        self.df = df
+
+    def __len__(self):
+        return len(self.df)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(map(tuple, self.df.iloc[index].to_numpy(dtype=object).tolist()))
+        index = range(len(self))[index]
+        return tuple(self.df.iloc[index:index + 1].to_numpy(dtype=object).tolist()[0])
+
+    def __iter__(self):
+        for start in range(0, len(self), self.CHUNK_SIZE):
+            yield from self[start:start + self.CHUNK_SIZE]
+
+    def __add__(self, other):
+        return list(self) + list(other)
+
+    def __radd__(self, other):
+        return list(other) + list(self)
+
+    def __eq__(self, other):
+        return isinstance(other, collections.abc.Sequence) and list(self) == list(map(tuple, other))
+
+    def __repr__(self):
+        return repr(list(self))
+
 @dataclasses.dataclass
 class Table:
     headers: list
     data: list
     meta: dict = dataclasses.field(default_factory=dict)
 
+    @classmethod
+    def from_df(cls, df, meta=None):
+        '''Creates a `Table` stored as the given DataFrame, `data` is then a lazy `Rows` view of it.'''
+        return cls(headers=df.columns.to_list(), data=Rows(df), meta={} if meta is None else meta)
+
     @property
-    @lru_cache(maxsize=1)
     def df(self):
-        return pd.DataFrame(self.data, columns=self.headers)
+        '''
+        The table as a DataFrame, built once per table and rebuilt only after `data` or `headers`
+        is replaced or rows are added to or removed from `data`. After editing a cell or replacing a
+        row in place, call `invalidate()`.
+        '''
+        data = self.data
+        if isinstance(data, Rows):
+            return data.df
+        key = (len(data), tuple(self.headers))
+        cached_data, cached_key, df = self.__dict__.get('_df', (None, None, None))
+        if cached_data is not data or cached_key != key:
+            df = pd.DataFrame(data, columns=self.headers)
+            self.__dict__['_df'] = (data, key, df)
+        return df
+
+    def invalidate(self):
+        '''Drops the cached DataFrame, so that `df` is rebuilt from `data` on its next access.'''
+        self.__dict__.pop('_df', None)
 
     def to_csv(self, filename):
         with open(filename, 'w', encoding='utf-8', newline='') as out:
@@ -67,6 +156,72 @@ class Table:
     def __hash__(self):
         return id(self)
 
+_cache_lock = threading.RLock()
+
+def cached(maxsize=1, ttl=None, mirror=None):
+    '''
+    Per-instance replacement for `lru_cache` on `info`-like properties and methods.
+
+    Results are kept on the object itself, so reading the `info` of many submissions and
+    going back to an earlier one does not refetch it. At most `maxsize` argument combinations
+    are kept per object (`None` for unbounded). Entries older than `ttl` seconds are refetched;
+    when `ttl` is not given, the course-wide `cache_ttl` is used (`None` never expires).
+
+    The wrapper exposes `cache_clear(instance=None)`, which clears a single object or every
+    live object of the class when no instance is given.
+
+    When the course has a `Mirror`, the `info` of collections (or any member given `mirror=True`)
+    is read from and written to it.
+    '''
+    def decorator(method):
+        key_name = method.__qualname__
+        owners = weakref.WeakSet()
+        mirrored = method.__name__ == 'info' if mirror is None else mirror
+
+        def compute(self, *args, **kwargs):
+            mirror = getattr(self, 'Mirror', None) if mirrored else None
+            if mirror is None or not mirror.covers(self):
+                return method(self, *args, **kwargs)
+            value = mirror.load(self)
+            if value is None:
+                value = method(self, *args, **kwargs)
+                mirror.store(self, value, kind=key_name)
+            return value
+
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            key = (args, tuple(sorted(kwargs.items())))
+            lifetime = ttl if ttl is not None else getattr(self, 'cache_ttl', None)
+            with _cache_lock:
+                store = self.__dict__.setdefault('_cache', {}).setdefault(key_name, OrderedDict())
+                if key in store:
+                    value, created_at = store[key]
+                    if lifetime is None or time.monotonic() - created_at < lifetime:
+                        store.move_to_end(key)
+                        return value
+                    del store[key]
+            value = compute(self, *args, **kwargs)
+            with _cache_lock:
+                store[key] = (value, time.monotonic())
+                while maxsize is not None and len(store) > maxsize:
+                    store.popitem(last=False)
+                owners.add(self)
+            return value
+
+        def cache_clear(instance=None):
+            with _cache_lock:
+                cleared = [instance] if instance is not None else list(owners)
+                for owner in cleared:
+                    owner.__dict__.get('_cache', {}).pop(key_name, None)
+            for owner in cleared if mirrored else []:
+                mirror = getattr(owner, 'Mirror', None)
+                if mirror is not None and mirror.covers(owner):
+                    mirror.invalidate(owner)
+
+        wrapper.cache_clear = cache_clear
+        return wrapper
+    return decorator
+
 class Rooted:
     def __init__(self, root, id=None, skip_url=False):
         self.root = root
@@ -86,76 +241,703 @@ class Rooted:
             result = self.root.__getattribute__(name)
         return result
 
+    @property
+    def name_index(self):
+        '''`NameIndex` of the current `info`, rebuilt only when `info` is fetched again.'''
+        info = self.info
+        cached_info, index = self.__dict__.get('_name_index', (None, None))
+        if cached_info is not info:
+            index = NameIndex(info.data)
+            self.__dict__['_name_index'] = (info, index)
+        return index
+
     @property
     def name_to_id(self):
-        return {row[index_of_first_string(row)]: row[0] for row in self.info.data}
+        return self.name_index.name_to_id
 
     def flush_cache(self):
-        try:
-            self.__class__.info.fget.cache_clear()
-            self.__class__.stats.fget.cache_clear()
-        except AttributeError:
-            pass
-        except Exception as e:
-            print("error while clearing cache", e)
+        '''Clears every `cached` member of this class, e.g. `info` and `stats`, and marks their mirrored copies stale.'''
+        mirror = getattr(self, 'Mirror', None)
+        for cls in type(self).__mro__:
+            for member in vars(cls).values():
+                member = member.fget if isinstance(member, property) else member
+                try:
+                    member.cache_clear()
+                    if mirror is not None:
+                        mirror.invalidate(kind=member.__qualname__)
+                except AttributeError:
+                    pass
+                except Exception as e:
+                    print("error while clearing cache", e)
+
+def backoff(initial_delay=0.5, max_delay=10):
+    '''Yields exponentially growing delays in seconds, each jittered down by up to half.'''
+    delay = initial_delay
+    while True:
+        yield random.uniform(delay / 2, delay)
+        delay = min(max_delay, delay * 2)
 
 def redirect(request_method):
-    def helper(self, *args, **kwargs):
-        response = request_method(self, *args, **kwargs)
-        if response.status_code == 401:
-            print("=== Coursemology sign-in required ===")
-            if os.path.dirname(LOGIN_FILENAME) != '':
-                os.makedirs(os.path.dirname(LOGIN_FILENAME), exist_ok=True)
-            validLogin = os.path.exists(LOGIN_FILENAME) and kwargs.get('tag') != 'retry_sign_in'
-            if validLogin:
-                print('Reading cached login particulars...')
-                try:
-                    login_data = json_load(LOGIN_FILENAME)
-                    username, password = login_data['username'], login_data['password']
-                except:
-                    validLogin = False
-            if not validLogin:
-                print('Requesting login particulars...')
-                username = input('username: ')
-                password = getpass('password: ')
-                json_save(LOGIN_FILENAME, {
-                    'username': username,
-                    'password': password
-                })
-            print("Logging in...")
-            self.session = authenticate(username, password, headless=self.login_headless, wait_time=self.login_wait_time)
-            self.dump_cookies()
+    '''
+    Handles 401 (sign in again), 422 (fresh CSRF token) and 202 (retry until processed). With
+    `wait_job=False`, a 202 response is returned as it is, e.g. to let `Job` poll it.
+    '''
+    @wraps(request_method)
+    def helper(self, *args, wait_job=True, **kwargs):
+        delays = backoff()
+        deadline = time.monotonic() + self.job_timeout
+        while True:
+            generation = self.check_session()
             response = request_method(self, *args, **kwargs)
-        if response.status_code == 202:
-            print('Processing job... Retrying in 2 seconds.')
-            time.sleep(2)
-            response = redirect(request_method)(self, *args, **kwargs)
-        return response
+            if response.status_code == 401:
+                self.renew(generation, retry=kwargs.get('tag') == 'retry_sign_in')
+                response = request_method(self, *args, **kwargs)
+            if response.status_code == 422 and self.replace_csrf_token(response, args, kwargs):
+                response = request_method(self, *args, **kwargs)
+            if response.status_code != 202 or not wait_job:
+                return response
+            if time.monotonic() > deadline:
+                raise TimeoutError(f'Job still processing after {self.job_timeout} seconds: {response.url}')
+            delay = next(delays)
+            print(f'Processing job... Retrying in {delay:.1f} seconds.')
+            time.sleep(delay)
     return helper
 
+class Job:
+    '''
+    Tracks a background job of Coursemology, i.e. a response with a `jobUrl` that eventually
+    turns into one with a `redirectUrl`. The job is polled with exponential backoff and jitter,
+    and gives up after `timeout` seconds, by default the `job_timeout` of `http`.
+    '''
+
+    def __init__(self, http, response, timeout=None, initial_delay=0.5, max_delay=10):
+        self.http = http
+        self.json = response.json()
+        self.job_url = self.json.get('jobUrl')
+        self.timeout = http.job_timeout if timeout is None else timeout
+        self.deadline = time.monotonic() + self.timeout
+        self.delays = backoff(initial_delay, max_delay)
+        self.next_poll_at = time.monotonic() + next(self.delays)
+        self.cancelled = threading.Event()
+
+    @property
+    def completed(self):
+        return 'redirectUrl' in self.json or self.json.get('status') == 'completed'
+
+    @property
+    def failed(self):
+        return 'error' in self.json or self.json.get('status') == 'errored'
+
+    @property
+    def finished(self):
+        return self.completed or self.failed or self.cancelled.is_set()
+
+    @property
+    def redirect_url(self):
+        return self.json.get('redirectUrl')
+
+    def poll(self):
+        if self.job_url is None:
+            raise Exception(f'Unexpected job response: {self.json}')
+        # a pending job answers 202, which must not block the other jobs of `wait_all`
+        response = self.http.get(self.http.URL_BASE + self.job_url + self.http.URL_FORMAT_JSON, wait_job=False)
+        self.json = response.json()
+        self.next_poll_at = time.monotonic() + next(self.delays)
+        return self
+
+    def cancel(self):
+        '''Stops polling this job, also when it is waited on from another thread'''
+        self.cancelled.set()
+
+    def wait(self):
+        Job.wait_all([self])
+        if self.cancelled.is_set():
+            raise concurrent.futures.CancelledError(f'Job cancelled: {self.job_url}')
+        return self
+
+    @staticmethod
+    def wait_all(jobs):
+        '''Polls several jobs together until each of them is completed, failed or cancelled'''
+        while True:
+            pending = [job for job in jobs if not job.finished]
+            if not pending:
+                return jobs
+            job = min(pending, key=lambda job: job.next_poll_at)
+            if time.monotonic() > job.deadline:
+                raise TimeoutError(f'Job not completed after {job.timeout} seconds: {job.job_url}')
+            if job.cancelled.wait(max(0, job.next_poll_at - time.monotonic())):
+                continue
+            job.poll()
+
+class DiskCache:
+    '''
+    On-disk store of GET responses, revalidated with `If-None-Match`/`If-Modified-Since`.
+
+    Only responses carrying an `ETag` or `Last-Modified` header are stored. Entries older than
+    `max_age` seconds are dropped, and the oldest entries are evicted once the bodies exceed
+    `max_size` bytes in total. Files are written elsewhere and moved into place, so the cache can
+    be shared by several threads.
+    '''
+
+    def __init__(self, directory, max_size=256 * 2**20, max_age=7 * 24 * 3600):
+        self.directory = directory
+        self.max_size = max_size
+        self.max_age = max_age
+        self.prune_lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, url, params=None):
+        key = url if params is None else url + json.dumps(params, sort_keys=True, default=str)
+        return os.path.join(self.directory, hashlib.sha256(key.encode('utf-8')).hexdigest())
+
+    def load(self, url, params=None):
+        path = self.path(url, params)
+        try:
+            entry = json_load(path + '.json')
+            with open(path + '.body', 'rb') as f:
+                entry['content'] = f.read()
+        except (OSError, ValueError):
+            return None
+        if entry.get('body_hash') != hashlib.sha256(entry['content']).hexdigest():
+            # body and metadata of different writes
+            return None
+        if self.max_age is not None and time.time() - entry['stored_at'] > self.max_age:
+            self.remove(path)
+            return None
+        return entry
+
+    def validators(self, entry):
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    @staticmethod
+    def write(path, content):
+        '''Writes `content` to a temporary file and moves it to `path`, so readers never see it half-written.'''
+        temporary = f'{path}.{uuid.uuid4().hex}.tmp'
+        try:
+            with open(temporary, 'wb') as f:
+                f.write(content)
+            os.replace(temporary, path)
+        except OSError:
+            try:
+                os.remove(temporary)
+            except OSError:
+                pass
+            raise
+
+    def update(self, url, response, entry=None, params=None):
+        '''Stores a fresh response, or rebuilds the cached one if the server answered 304.'''
+        if response.status_code == 304 and entry is not None:
+            cached_response = Response()
+            cached_response.status_code = 200
+            cached_response.reason = 'OK'
+            cached_response._content = entry['content']
+            cached_response.headers = requests.structures.CaseInsensitiveDict(entry['headers'])
+            cached_response.encoding = entry['encoding']
+            cached_response.url = response.url
+            cached_response.request = response.request
+            cached_response.history = response.history
+            cached_response.elapsed = response.elapsed
+            try:
+                os.utime(self.path(url, params) + '.body')
+            except FileNotFoundError:
+                # evicted meanwhile
+                pass
+            return cached_response
+        etag, last_modified = response.headers.get('ETag'), response.headers.get('Last-Modified')
+        if response.status_code == 200 and (etag or last_modified):
+            path = self.path(url, params)
+            metadata = json.dumps({
+                'url': url,
+                'etag': etag,
+                'last_modified': last_modified,
+                'headers': dict(response.headers),
+                'encoding': response.encoding,
+                'body_hash': hashlib.sha256(response.content).hexdigest(),
+                'stored_at': time.time(),
+            })
+            try:
+                self.write(path + '.body', response.content)
+                self.write(path + '.json', metadata.encode('utf-8'))
+            except FileNotFoundError:
+                # the directory was removed meanwhile
+                return response
+            self.prune()
+        return response
+
+    def remove(self, path):
+        for suffix in ('.json', '.body'):
+            try:
+                os.remove(path + suffix)
+            except OSError:
+                pass
+
+    def prune(self):
+        if self.max_size is None:
+            return
+        with self.prune_lock:
+            bodies = []
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith('.body'):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    bodies.append((stat.st_mtime, stat.st_size, entry.path[:-len('.body')]))
+            total = sum(size for _, size, _ in bodies)
+            for _, size, path in sorted(bodies):
+                if total <= self.max_size:
+                    break
+                self.remove(path)
+                total -= size
+
+    def clear(self):
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(('.json', '.body')):
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+
+class MultipartStream:
+    '''
+    File-like `multipart/form-data` body with the file read lazily in chunks, so that
+    uploading a file does not load it into memory. Pass it as `data` with `content_type`
+    as the `Content-Type` header.
+    '''
+
+    def __init__(self, fields, file_field, filepath):
+        boundary = uuid.uuid4().hex
+        self.content_type = f'multipart/form-data; boundary={boundary}'
+        head = ''.join(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'
+                       for name, value in fields.items())
+        head += f'--{boundary}\r\nContent-Disposition: form-data; name="{file_field}"; filename="{os.path.basename(filepath)}"\r\n'
+        head += 'Content-Type: application/octet-stream\r\n\r\n'
+        tail = f'\r\n--{boundary}--\r\n'
+        self.file = open(filepath, 'rb')
+        self.parts = [io.BytesIO(head.encode('utf-8')), self.file, io.BytesIO(tail.encode('utf-8'))]
+        self.len = len(head.encode('utf-8')) + os.path.getsize(filepath) + len(tail.encode('utf-8'))
+        self.index = 0
+
+    def read(self, size=-1):
+        chunks = []
+        while self.index < len(self.parts) and size != 0:
+            chunk = self.parts[self.index].read(size)
+            if not chunk:
+                self.index += 1
+                continue
+            chunks.append(chunk)
+            size = size - len(chunk) if size > 0 else size
+        if not chunks:
+            # Rewind once fully sent, so that `redirect` can send the body again after signing in
+            for part in self.parts:
+                part.seek(0)
+            self.index = 0
+        return b''.join(chunks)
+
+    def __len__(self):
+        return self.len
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        self.close()
+
+class TokenBucket:
+    '''
+    Allows `rate` requests per second on average and bursts of up to `burst` requests.
+    Waiting callers are served by priority (lower first), then in arrival order.
+    '''
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        # at least one token, or a rate below 1 per second would never let a request through
+        self.burst = max(1, burst or rate)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.condition = threading.Condition()
+        self.waiting = []
+        self.counter = itertools.count()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, priority=0):
+        entry = (priority, next(self.counter))
+        with self.condition:
+            heapq.heappush(self.waiting, entry)
+            try:
+                while True:
+                    self.refill()
+                    if self.waiting[0] == entry and self.tokens >= 1:
+                        heapq.heappop(self.waiting)
+                        self.tokens -= 1
+                        return
+                    self.condition.wait((1 - self.tokens) / self.rate if self.waiting[0] == entry else None)
+            finally:
+                if entry in self.waiting:
+                    self.waiting.remove(entry)
+                    heapq.heapify(self.waiting)
+                self.condition.notify_all()
+
+class Response(requests.Response):
+    '''
+    `requests.Response` whose `json()` decodes the body once, with orjson or ujson when installed,
+    and returns the same object on every later call. Do not modify the result in place.
+    '''
+
+    def json(self, **kwargs):
+        if kwargs:
+            return super().json(**kwargs)
+        if '_json' not in self.__dict__:
+            try:
+                self._json = json_loads(self.content)
+            except ValueError:
+                self._json = super().json()
+        return self._json
+
+class Session(requests.Session):
+    '''
+    `requests.Session` that applies a default `timeout` to every request without one, and takes
+    a token from `read_limiter` (GET, HEAD, OPTIONS) or `write_limiter` (anything else) first.
+    Responses are returned as `Response`.
+    '''
+
+    READ_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+
+    def __init__(self, timeout=None, read_limiter=None, write_limiter=None):
+        super().__init__()
+        self.timeout = timeout
+        self.read_limiter = read_limiter
+        self.write_limiter = write_limiter
+
+    def request(self, method, url, **kwargs):
+        limiter = self.read_limiter if method.upper() in self.READ_METHODS else self.write_limiter
+        if limiter is not None:
+            limiter.acquire(HTTP.current_priority.get())
+        kwargs.setdefault('timeout', self.timeout)
+        response = super().request(method, url, **kwargs)
+        response.__class__ = Response
+        return response
+
+class Cassette:
+    '''
+    Recording of HTTP exchanges in a gzip-compressed file of JSON lines, to run a workload again offline.
+
+    While recording, every response is stored with the time it took, except 401 responses and the
+    exchanges of the sign-in, so the file holds no credentials. While replaying, nothing is sent:
+    each request is answered with the next recorded response of the same method and URL, preferring
+    one with the same body, after waiting the recorded time times `latency_scale`, or `latency`
+    seconds if given. Recorded bodies are read in full, including those of streamed downloads.
+    '''
+
+    skip = contextvars.ContextVar('cassette_skip', default=False)
+
+    def __init__(self, path, mode='record', latency=None, latency_scale=1.0):
+        assert mode in ('record', 'replay'), f"mode must be 'record' or 'replay'. Was given {mode!r}"
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self.latency_scale = latency_scale
+        self.lock = threading.Lock()
+        self.entries = collections.defaultdict(list)
+        self.file = None
+        if mode == 'record':
+            if os.path.dirname(path) != '':
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            self.file = gzip.open(path, 'wt', encoding='utf-8')
+        else:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    entry = json.loads(line)
+                    entry['used'] = False
+                    self.entries[(entry['method'], entry['url'])].append(entry)
+
+    @property
+    def replaying(self):
+        return self.mode == 'replay'
+
+    @staticmethod
+    @contextlib.contextmanager
+    def paused():
+        '''Leaves the requests made inside the block, in this thread, out of the recording.'''
+        token = Cassette.skip.set(True)
+        try:
+            yield
+        finally:
+            Cassette.skip.reset(token)
+
+    @staticmethod
+    def body_hash(request):
+        body = request.body.encode('utf-8') if isinstance(request.body, str) else request.body
+        return hashlib.sha256(body).hexdigest() if isinstance(body, bytes) else None
+
+    def record(self, request, response, elapsed):
+        if self.file is None or Cassette.skip.get() or response.status_code == 401:
+            return
+        entry = {
+            'method': request.method,
+            'url': request.url,
+            'body': self.body_hash(request),
+            'status': response.status_code,
+            'reason': response.reason,
+            'headers': {key: value for key, value in response.headers.items() if key.lower() != 'set-cookie'},
+            'content': base64.b64encode(response.content).decode('ascii'),
+            'elapsed': elapsed,
+        }
+        line = json.dumps(entry) + '\n'
+        with self.lock:
+            if self.file is not None:
+                self.file.write(line)
+
+    def play(self, request):
+        body = self.body_hash(request)
+        with self.lock:
+            entries = self.entries.get((request.method, request.url))
+            if not entries:
+                raise requests.exceptions.ConnectionError(
+                    f'No recorded response for {request.method} {request.url} in {self.path}', request=request)
+            unused = [entry for entry in entries if not entry['used']]
+            entry = next((entry for entry in unused if entry['body'] == body), unused[0] if unused else entries[-1])
+            entry['used'] = True
+        time.sleep(entry['elapsed'] * self.latency_scale if self.latency is None else self.latency)
+        response = Response()
+        response.status_code = entry['status']
+        response.reason = entry['reason']
+        response.headers = requests.structures.CaseInsensitiveDict(entry['headers'])
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response._content = base64.b64decode(entry['content'])
+        response._content_consumed = True
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class CassetteAdapter(HTTPAdapter):
+    '''`HTTPAdapter` that records its exchanges to `cassette`, or answers from it without sending anything.'''
+
+    def __init__(self, cassette, **kwargs):
+        self.cassette = cassette
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if self.cassette.replaying:
+            return self.cassette.play(request)
+        start = time.monotonic()
+        response = super().send(request, **kwargs)
+        response.content
+        self.cassette.record(request, response, time.monotonic() - start)
+        return response
+
 class HTTP(Rooted):
 
-    VALID_STATUS_CODES = {200, 201, 202, 302}
+    VALID_STATUS_CODES = {200, 201, 202, 206, 302}
+    RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+    INTERACTIVE = 0
+    BACKGROUND  = 1
+    current_priority = contextvars.ContextVar('current_priority', default=INTERACTIVE)
 
-    def __init__(self, root, cookie_path):
+    def __init__(self, root, cookie_path, disk_cache=None, job_timeout=600, pool_connections=10,
+                 pool_maxsize=32, max_retries=3, retry_backoff=0.5, timeout=(10, 120),
+                 read_rate=None, write_rate=None, session_path=SESSION_FILENAME, cassette=None):
+        self.cassette = cassette
+        self.read_limiter = TokenBucket(read_rate, burst=2 * read_rate) if read_rate else None
+        self.write_limiter = TokenBucket(write_rate, burst=2 * write_rate) if write_rate else None
         self.cookie_path = cookie_path
-        self.session = requests.Session()
+        self.disk_cache = disk_cache
+        self.job_timeout = job_timeout
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.timeout = timeout
+        self.session_path = session_path
+        self.sign_in_lock = threading.Lock()
+        self.generation = 0
+        self.expires_at = None
+        self.id_token_expires_at = None
+        self.session = self.new_session()
         self.load_cookies()
         super().__init__(root)
 
+    def new_session(self):
+        '''
+        Returns a session with the connection pool, retry policy and timeout of this instance.
+        Idempotent requests answered with 429 or 5xx are retried with exponential backoff,
+        honouring `Retry-After`. POST and PATCH are never retried.
+        '''
+        session = Session(timeout=self.timeout, read_limiter=self.read_limiter, write_limiter=self.write_limiter)
+        self.mount_adapter(session)
+        return session
+
+    def mount_adapter(self, session):
+        retries = Retry(total=self.max_retries, backoff_factor=self.retry_backoff,
+                        status_forcelist=self.RETRY_STATUS_CODES, allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+                        respect_retry_after_header=True, raise_on_status=False)
+        kwargs = {'pool_connections': self.pool_connections, 'pool_maxsize': self.pool_maxsize, 'max_retries': retries}
+        adapter = HTTPAdapter(**kwargs) if self.cassette is None else CassetteAdapter(self.cassette, **kwargs)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+
+    def use_cassette(self, cassette):
+        '''Records to or replays from `cassette` from now on, or goes back to the network if it is `None`.'''
+        self.cassette = cassette
+        self.mount_adapter(self.session)
+        return cassette
+
+    @staticmethod
+    @contextlib.contextmanager
+    def priority(priority):
+        '''
+        Sends the requests made inside the block, including those of `parallel_map` workers, with
+        the given priority. `HTTP.INTERACTIVE` requests are let through before `HTTP.BACKGROUND` ones.
+        '''
+        token = HTTP.current_priority.set(priority)
+        try:
+            yield
+        finally:
+            HTTP.current_priority.reset(token)
+
     def load_cookies(self):
         if os.path.isfile(self.cookie_path):
             cookie_jar = requests.utils.cookiejar_from_dict(json_load(self.cookie_path))
             self.session.cookies.update(cookie_jar)
+        if os.path.isfile(self.session_path):
+            session_data = json_load(self.session_path)
+            self.expires_at = session_data.get('expires_at')
+            self.id_token_expires_at = session_data.get('id_token_expires_at')
 
     def dump_cookies(self):
         # Just in case it's needed, this can be a rather quick lookup
         self.cookie_dict = self.session.cookies.get_dict()
         json_save(self.cookie_path, self.cookie_dict)
+        json_save(self.session_path, {'expires_at': self.expires_at, 'id_token_expires_at': self.id_token_expires_at})
+
+    RENEW_MARGIN = 300
+
+    @staticmethod
+    def session_expiry(session):
+        '''
+        Returns the expiry (epoch seconds) of the session cookie, the earliest of any cookie whose
+        name contains `session` (or of all cookies if there is none), or `None` if unknown.
+        '''
+        cookies = [cookie for cookie in session.cookies if cookie.expires]
+        cookies = [cookie for cookie in cookies if 'session' in cookie.name.lower()] or cookies
+        return min(cookie.expires for cookie in cookies) if cookies else None
+
+    @staticmethod
+    def token_expiry(session):
+        '''Returns the `exp` claim (epoch seconds) of the session's `id_token`, or `None` if unknown.'''
+        try:
+            payload = session.id_token.split('.')[1]
+            return json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))['exp']
+        except (AttributeError, IndexError, KeyError, ValueError):
+            return None
+
+    def check_session(self):
+        '''
+        Signs in again if the session cookie expires within `RENEW_MARGIN` seconds. Requests are
+        authenticated by cookies only, so the shorter-lived `id_token` does not trigger a sign-in.
+        Returns the session generation, which `renew` uses to tell whether another thread has
+        signed in meanwhile.
+        '''
+        generation = self.generation
+        if self.expires_at is not None and time.time() > self.expires_at - self.RENEW_MARGIN:
+            self.renew(generation)
+        return self.generation
+
+    def renew(self, generation, retry=False):
+        '''Signs in again, unless another thread already did after `generation` was read.'''
+        with self.sign_in_lock:
+            if self.generation == generation:
+                self.sign_in(retry=retry)
+                self.generation += 1
+
+    # Rails' InvalidAuthenticityToken, as a JSON error or its default 422 page
+    CSRF_REJECTION = re.compile(r'authenticity[ _]?token|csrf|The change you wanted was rejected', re.IGNORECASE)
+
+    def replace_csrf_token(self, response, args, kwargs):
+        '''
+        Puts a fresh CSRF token into the headers or form data of a mutation rejected for its token.
+        Returns whether the request carried a token and was rejected for it, i.e. whether it is worth
+        retrying. Other 422 responses, such as validation errors, are not retried.
+        '''
+        headers = kwargs.get('headers') or {}
+        names = [name for name in headers if name.lower() == 'x-csrf-token']
+        forms = [data for data in (*args, kwargs.get('data')) if isinstance(data, dict) and 'authenticity_token' in data]
+        if not names and not forms or not self.CSRF_REJECTION.search(response.text):
+            return False
+        type(self.root).auth_token.fget.cache_clear(self.root)
+        token = self.root.auth_token
+        kwargs['headers'] = {**headers, **{name: token for name in names}}
+        for data in forms:
+            data['authenticity_token'] = token
+        return True
+
+    def sign_in(self, retry=False):
+        if self.cassette is not None and self.cassette.replaying:
+            # replayed responses need no session
+            self.expires_at = self.id_token_expires_at = None
+            return
+        print("=== Coursemology sign-in required ===")
+        if os.path.dirname(LOGIN_FILENAME) != '':
+            os.makedirs(os.path.dirname(LOGIN_FILENAME), exist_ok=True)
+        validLogin = os.path.exists(LOGIN_FILENAME) and not retry
+        if validLogin:
+            print('Reading cached login particulars...')
+            try:
+                login_data = json_load(LOGIN_FILENAME)
+                username, password = login_data['username'], login_data['password']
+            except:
+                validLogin = False
+        if not validLogin:
+            print('Requesting login particulars...')
+            username = input('username: ')
+            password = getpass('password: ')
+            json_save(LOGIN_FILENAME, {
+                'username': username,
+                'password': password
+            })
+        print("Logging in...")
+        with Cassette.paused():
+            self.session = authenticate(username, password, headless=self.login_headless, wait_time=self.login_wait_time,
+                                        session=self.new_session(), method=self.login_method)
+        self.expires_at = self.session_expiry(self.session)
+        self.id_token_expires_at = self.token_expiry(self.session)
+        self.dump_cookies()
+        type(self.root).auth_token.fget.cache_clear(self.root)
 
     @redirect
     def get(self, url, data=None, **kwargs):
+        use_cache = self.disk_cache is not None and not kwargs.get('stream')
+        entry = self.disk_cache.load(url, kwargs.get('params')) if use_cache else None
+        if entry is not None:
+            kwargs['headers'] = {**self.disk_cache.validators(entry), **(kwargs.get('headers') or {})}
         response = self.session.get(url, data=data, **kwargs)
+        if use_cache:
+            response = self.disk_cache.update(url, response, entry, kwargs.get('params'))
         return self.with_warning(response)
 
     @redirect
@@ -178,6 +960,60 @@ class HTTP(Rooted):
         response = self.session.delete(url, data=data, **kwargs)
         return self.with_warning(response)
 
+    def download(self, url, path, chunk_size=2**20, resume=True, progress_bar=False):
+        '''
+        Streams `url` into the file at `path` chunk by chunk. The download goes to a partial
+        file first, and with `resume` an interrupted download continues with a `Range` request.
+        The `ETag` or `Last-Modified` of the first response is kept next to the partial file and
+        sent as `If-Range`, so a resource changed meanwhile is downloaded again from the start.
+        '''
+        partial = f"{path}.{hashlib.sha1(url.encode('utf-8')).hexdigest()[:12]}.part"
+        validator_path = partial + '.json'
+        validator = None
+        if resume and os.path.exists(partial):
+            try:
+                validator = json_load(validator_path)['validator']
+            except (OSError, ValueError, KeyError):
+                pass
+        start = os.path.getsize(partial) if validator else 0
+        headers = {'Range': f'bytes={start}-', 'If-Range': validator} if start else {}
+        with self.get(url, stream=True, headers=headers) as response:
+            if response.status_code == 416 and start:
+                # the partial file is not a prefix of the resource, e.g. it already covers all of it
+                response.close()
+                self.discard_partial(partial)
+                return self.download(url, path, chunk_size=chunk_size, resume=False, progress_bar=progress_bar)
+            assert response.ok, f'Response not OK, status code is {response.status_code}'
+            if response.status_code != 206:
+                start = 0
+                etag = response.headers.get('ETag')
+                # If-Range only accepts strong ETags
+                validator = etag if etag and not etag.startswith('W/') else response.headers.get('Last-Modified')
+                if validator:
+                    json_save(validator_path, {'url': url, 'validator': validator})
+                elif os.path.exists(validator_path):
+                    os.remove(validator_path)
+            total = int(response.headers.get('Content-Length', 0)) + start
+            pbar = tqdm(total=total or None, initial=start, unit='B', unit_scale=True) if progress_bar else None
+            with open(partial, 'ab' if start else 'wb') as f:
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    f.write(chunk)
+                    if pbar is not None:
+                        pbar.update(len(chunk))
+            if pbar is not None:
+                pbar.close()
+        os.replace(partial, path)
+        self.discard_partial(partial)
+        return path
+
+    @staticmethod
+    def discard_partial(partial):
+        for leftover in (partial, partial + '.json'):
+            try:
+                os.remove(leftover)
+            except FileNotFoundError:
+                pass
+
     @staticmethod
     def with_warning(response):
         if response.status_code not in HTTP.VALID_STATUS_CODES:
@@ -210,21 +1046,86 @@ illegal_chars = re.compile("[^a-zA-Z0-9]+")
 def str2path(string):
     return illegal_chars.sub(' ', string).strip().replace(' ', '_').lower()
 
+class NameIndex:
+    '''
+    Bidirectional index of the names and IDs of a resource's `info` rows. The name of a row is
+    its first string. Besides exact lookups, names can be found case-insensitively, by prefix or
+    by similarity.
+    '''
+
+    def __init__(self, rows):
+        self.name_to_id = {}
+        for row in rows:
+            self.name_to_id[row[index_of_first_string(row)]] = row[0]
+        self.id_to_name = {id: name for name, id in self.name_to_id.items()}
+        self.folded = sorted((name.casefold(), name) for name in self.name_to_id)
+
+    def prefixed(self, prefix):
+        '''Returns the names starting with `prefix`, ignoring case, in sorted order.'''
+        prefix = prefix.casefold()
+        start = bisect.bisect_left(self.folded, (prefix,))
+        end = bisect.bisect_left(self.folded, (prefix + '\U0010ffff',))
+        return [name for _, name in self.folded[start:end]]
+
+    def similar(self, name, n=3, cutoff=0.6):
+        '''Returns up to `n` names most similar to `name`.'''
+        return difflib.get_close_matches(name, list(self.name_to_id), n=n, cutoff=cutoff)
+
+    def find(self, name):
+        '''
+        Returns the ID of `name`: an exact match, else the only name equal to it ignoring case,
+        else the only name starting with it. Returns `None` if there is no such single name.
+        '''
+        if name in self.name_to_id:
+            return self.name_to_id[name]
+        if not isinstance(name, str):
+            return None
+        candidates = self.prefixed(name)
+        exact = [candidate for candidate in candidates if candidate.casefold() == name.casefold()]
+        candidates = exact or candidates
+        return self.name_to_id[candidates[0]] if len(candidates) == 1 else None
+
 def guess_id(getter):
     def guesser(self, *args, **kwargs):
         if 'id' in kwargs:
             return getter(self, id=kwargs.pop('id'))
         if args and type(args[0]) == int:
             return getter(self, id=args[0])
-        if 'name' in kwargs and kwargs['name'] in self.name_to_id:
-            return getter(self, id=self.name_to_id[kwargs.pop('name')])
-        if args and args[0] in self.name_to_id:
-            return getter(self, id=self.name_to_id[args[0]])
-        if args and args[0] in self.name_to_id.values():
+        index = self.name_index
+        if 'name' in kwargs and index.find(kwargs['name']) is not None:
+            return getter(self, id=index.find(kwargs.pop('name')))
+        if args and index.find(args[0]) is not None:
+            return getter(self, id=index.find(args[0]))
+        if args and args[0] in index.id_to_name:
             return getter(self, id=args[0])
-        raise Exception(f"Given `id` or `name` does not exist: {args if args else ''}{kwargs if kwargs else ''}")
+        name = kwargs.get('name', args[0] if args else None)
+        similar = index.similar(name) if isinstance(name, str) else []
+        hint = f" Did you mean: {', '.join(map(repr, similar))}?" if similar else ''
+        raise Exception(f"Given `id` or `name` does not exist: {args if args else ''}{kwargs if kwargs else ''}{hint}")
     return guesser
 
+def parallel_map(func, items, max_workers=8, progress_bar=False):
+    '''
+    Calls `func` on every item using a pool of at most `max_workers` threads.
+    Returns `(result, error)` pairs in the order of `items`, so one failure does not abort the batch.
+    Workers run with the request priority of the caller.
+    '''
+    items = list(items)
+    results = [(None, None)] * len(items)
+    pbar = tqdm(total=len(items)) if progress_bar else None
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(contextvars.copy_context().run, func, item): i for i, item in enumerate(items)}
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                results[futures[future]] = (future.result(), None)
+            except Exception as e:
+                results[futures[future]] = (None, e)
+            if pbar is not None:
+                pbar.update(1)
+    if pbar is not None:
+        pbar.close()
+    return results
+
 def get_question_id(instance, question, idx=0):
     question_ids = [row[idx] for row in instance.info.data]
     question_id  =  question_ids[0]                 if question == 'first' else \
@@ -257,19 +1158,59 @@ def flatten_dictionary(dictionary, parent_key='', separator='_'):
             items.append((new_key, value))
     return dict(items)
 
-def records_to_df(records):
-    assert len(records) > 0, "Records can't be empty"
-
-    records = [flatten_dictionary(record, separator=': ') for record in records]
+def flatten_columns(records, index, prefix='', separator=': '):
+    '''
+    Returns `(first_row, name, column)` of every flattened column of `records`, where `first_row`
+    is the label in `index` of the first record holding the key, even if its value is null.
+    '''
+    df = pd.DataFrame.from_records(records, index=index)
+    columns = []
+    for key, column in df.items():
+        name = prefix + str(key)
+        first = index[next(i for i, record in enumerate(records) if key in record)]
+        is_dict = np.fromiter((isinstance(value, MutableMapping) for value in column.to_numpy()), dtype=bool,
+                              count=len(column)) if column.dtype == object else None
+        if is_dict is None or not is_dict.any():
+            columns.append((first, name, column))
+            continue
+        scalars = [i for i in np.flatnonzero(~is_dict) if key in records[i]]
+        if scalars:
+            # typed like the rest of the records, e.g. a null object is NaN
+            rest = pd.DataFrame.from_records([{key: records[i][key]} for i in scalars], index=index[scalars])
+            columns.append((index[scalars[0]], name, rest[key]))
+        nested = column[is_dict].tolist()
+        columns.extend(flatten_columns(nested, index[is_dict], prefix=name + separator, separator=separator))
+    return columns
 
-    df = pd.DataFrame.from_records(records)
+def flatten_records(records, separator=': '):
+    '''
+    Columnar `flatten_dictionary` of a list of records: builds a DataFrame of the records and
+    replaces every column holding dictionaries by the columns of those dictionaries, recursively.
+    The columns come in the order in which they first appear in the records, with NaN where a
+    record lacks them, as in `pd.DataFrame.from_records` of the flattened records.
+    '''
+    index = pd.RangeIndex(len(records))
+    columns = flatten_columns(records, index, separator=separator)
+    # columns first held by the same record come in that record's order
+    positions = {first: {name: i for i, name in enumerate(flatten_dictionary(records[first], separator=separator))}
+                 for first in {first for first, _, _ in columns}}
+    columns.sort(key=lambda column: (column[0], positions[column[0]][column[1]]))
+    return pd.DataFrame({name: column if len(column) == len(index) else column.reindex(index).infer_objects()
+                         for _, name, column in columns}, index=index)
 
-    mapping = {col:re.sub(r'(?<=[a-z])(?=[A-Z])', ' ', col).title() for col in df.columns}
+@lru_cache(maxsize=None)
+def title_columns(columns):
+    '''Maps the flattened record keys of a schema to title-cased headers, e.g. `creatorId` to `Creator Id`.'''
+    mapping = {col: re.sub(r'(?<=[a-z])(?=[A-Z])', ' ', col).title() for col in columns}
     mapping['id'] = 'ID'
+    return mapping
+
+def records_to_df(records):
+    assert len(records) > 0, "Records can't be empty"
 
-    df = df.rename(columns=mapping)
+    df = flatten_records(records)
 
-    return df
+    return df.rename(columns=title_columns(tuple(df.columns)))
 
 def get_default_info_table(instance, records_key=None, meta_keys=[], url=None):
     response = instance.HTTP.get((instance.URL + instance.URL_FORMAT_JSON) if url is None else url)
@@ -282,7 +1223,7 @@ def get_default_info_table(instance, records_key=None, meta_keys=[], url=None):
 
     df = records_to_df(records)
 
-    return Table(headers=df.columns.to_list(), data=df.values.tolist(), meta=meta)
+    return Table.from_df(df, meta=meta)
 
 def index_of_first_string(lst):
     for i, val in enumerate(lst):
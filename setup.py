@@ -9,5 +9,6 @@ setup(
     version='0.1.0',
     description='Coursemology API',
     long_description=readme,
-    install_requires=['requests', 'pandas', 'tqdm', 'tqdm-loggable', 'selenium']
+    install_requires=['requests', 'pandas', 'tqdm', 'tqdm-loggable'],
+    extras_require={'browser': ['selenium']}
 )